@@ -0,0 +1,20 @@
+"""Flush buffered clicks from Redis into the database."""
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import flush_click_events
+from shortener.services import flush_click_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered click events and pending click counts to the database. "
+        "Celery beat does this periodically; run it by hand where beat isn't running."
+    )
+
+    def handle(self, *args, **options):
+        events = flush_click_events()
+        urls = flush_click_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f"Flushed {events} click events and click counts for {urls} URLs.")
+        )
@@ -0,0 +1,13 @@
+"""Seed the Redis unique-visitor HyperLogLogs from stored click events."""
+
+from django.core.management.base import BaseCommand
+
+from analytics.services import seed_unique_visitors
+
+
+class Command(BaseCommand):
+    help = "Load distinct visitor IPs from ClickEvent into the per-URL HyperLogLogs."
+
+    def handle(self, *args, **options):
+        added = seed_unique_visitors()
+        self.stdout.write(self.style.SUCCESS(f"Seeded {added} (URL, IP) pairs."))
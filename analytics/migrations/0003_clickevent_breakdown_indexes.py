@@ -0,0 +1,39 @@
+# Generated by Django 6.0.9 on 2026-10-14 08:46
+
+from django.db import migrations, models
+
+from config.db_operations import AddIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0002_clickevent_clicked_at_default'),
+        ('shortener', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'country'], name='analytics_c_shorten_7bf201_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'browser'], name='analytics_c_shorten_31fa3b_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'os'], name='analytics_c_shorten_964818_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'device_type'], name='analytics_c_shorten_f39ccb_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'referrer'], name='analytics_c_shorten_8192d8_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.9 on 2026-10-14 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_clickevent_breakdown_indexes'),
+        ('shortener', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('shortened_url', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_clicks', to='shortener.shortenedurl')),
+            ],
+            options={
+                'verbose_name': 'Daily Click Rollup',
+                'verbose_name_plural': 'Daily Click Rollups',
+                'constraints': [models.UniqueConstraint(fields=('shortened_url', 'date'), name='analytics_daily_rollup_url_date_uniq')],
+            },
+        ),
+    ]
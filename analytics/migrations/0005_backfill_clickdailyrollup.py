@@ -0,0 +1,33 @@
+# Generated by Django 6.0.9 on 2026-10-14 08:47
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    ClickEvent = apps.get_model("analytics", "ClickEvent")
+    ClickDailyRollup = apps.get_model("analytics", "ClickDailyRollup")
+
+    rows = (
+        ClickEvent.objects.using(schema_editor.connection.alias)
+        .annotate(date=TruncDate("clicked_at"))
+        .values("shortened_url_id", "date")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    ClickDailyRollup.objects.using(schema_editor.connection.alias).bulk_create(
+        (ClickDailyRollup(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_clickdailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:05
+
+from django.db import migrations
+from django.utils import timezone
+
+from analytics.partitions import (
+    CLICK_EVENT_TABLE,
+    add_months,
+    create_month_partitions,
+    is_partitioned,
+)
+
+OLD_TABLE = f"{CLICK_EVENT_TABLE}_unpartitioned"
+
+
+def partition_clickevent(apps, schema_editor):
+    """Rebuild analytics_clickevent as a table range-partitioned by month.
+
+    PostgreSQL only; SQLite keeps the plain table. The primary key becomes
+    (id, clicked_at) because a partitioned table's unique constraints must
+    include the partition key; ids still come from a single sequence, so
+    they stay unique on their own. Existing indexes and the foreign key are
+    recreated under their original names, and a BRIN index on clicked_at is
+    added for cheap time-range pruning inside each partition.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    qn = connection.ops.quote_name
+    table, old = qn(CLICK_EVENT_TABLE), qn(OLD_TABLE)
+
+    with connection.cursor() as cursor:
+        # Already partitioned when re-applied after a backwards migration
+        if is_partitioned(cursor, CLICK_EVENT_TABLE):
+            return
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        cursor.execute(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (clicked_at)"
+        )
+        cursor.execute(f"CREATE TABLE {qn(CLICK_EVENT_TABLE + '_default')} PARTITION OF {table} DEFAULT")
+
+        cursor.execute(f"SELECT min(clicked_at), max(clicked_at) FROM {old}")
+        oldest, newest = cursor.fetchone()
+        this_month = timezone.now().date().replace(day=1)
+        first_month = (oldest.date() if oldest else this_month).replace(day=1)
+        last_month = max(newest.date() if newest else this_month, add_months(this_month, 2))
+        create_month_partitions(cursor, CLICK_EVENT_TABLE, first_month, last_month, qn)
+
+        cursor.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+
+        # Capture the old table's secondary indexes and foreign keys
+        cursor.execute(
+            "SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x "
+            "WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary",
+            [OLD_TABLE],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [OLD_TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {old}")
+        max_id = cursor.fetchone()[0]
+
+        # Drops the old identity sequence and frees the index names
+        cursor.execute(f"DROP TABLE {old}")
+
+        sequence = qn(f"{CLICK_EVENT_TABLE}_id_seq")
+        cursor.execute(f"CREATE SEQUENCE {sequence} AS bigint OWNED BY {table}.id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [f"{CLICK_EVENT_TABLE}_id_seq", max(max_id, 1), max_id > 0])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{CLICK_EVENT_TABLE}_id_seq')")
+
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {qn(CLICK_EVENT_TABLE + '_pkey')} "
+            "PRIMARY KEY (id, clicked_at)"
+        )
+        for index_def in index_defs:
+            cursor.execute(index_def.replace(f"{OLD_TABLE} ", f"{CLICK_EVENT_TABLE} "))
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {qn(name)} {definition}")
+        cursor.execute(
+            f"CREATE INDEX {qn(CLICK_EVENT_TABLE + '_clicked_at_brin')} "
+            f"ON {table} USING brin (clicked_at)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_backfill_clickdailyrollup'),
+    ]
+
+    operations = [
+        # Irreversible in place; the partitioned table works with every
+        # earlier migration state, so reversing leaves it as is
+        migrations.RunPython(partition_clickevent, migrations.RunPython.noop),
+    ]
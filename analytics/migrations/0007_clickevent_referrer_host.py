@@ -0,0 +1,63 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:00
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+from config.db_operations import AddIndexConcurrentlyIfPostgres
+
+
+def _referrer_host(referrer):
+    # Frozen copy of analytics.services.referrer_host
+    try:
+        return (urlsplit(referrer).hostname or "")[:255]
+    except ValueError:
+        return ""
+
+
+def backfill_referrer_host(apps, schema_editor):
+    ClickEvent = apps.get_model("analytics", "ClickEvent")
+    events = ClickEvent.objects.using(schema_editor.connection.alias)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            events.filter(pk__gt=last_pk)
+            .exclude(referrer="")
+            .order_by("pk")
+            .only("pk", "referrer")[:1000]
+        )
+        if not batch:
+            break
+        for event in batch:
+            event.referrer_host = _referrer_host(event.referrer)
+        events.bulk_update(batch, ["referrer_host"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    # Backfill commits per batch; CREATE INDEX CONCURRENTLY can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0006_partition_clickevent'),
+        ('shortener', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clickevent',
+            name='referrer_host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_referrer_host, migrations.RunPython.noop),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='clickevent',
+            index=models.Index(fields=['shortened_url', 'referrer_host'], name='analytics_c_shorten_ba292e_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_8192d8_idx',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_clickevent_referrer_host'),
+        ('shortener', '0003_user_recent_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickDimensionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Click Dimension Rollup',
+                'verbose_name_plural': 'Click Dimension Rollups',
+            },
+        ),
+        migrations.AddField(
+            model_name='clickdimensionrollup',
+            name='shortened_url',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dimension_clicks', to='shortener.shortenedurl'),
+        ),
+        migrations.AddConstraint(
+            model_name='clickdimensionrollup',
+            constraint=models.UniqueConstraint(fields=('shortened_url', 'dimension', 'value'), name='analytics_dim_rollup_url_dim_value_uniq'),
+        ),
+    ]
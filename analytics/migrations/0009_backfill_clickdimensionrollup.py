@@ -0,0 +1,66 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:17
+
+from django.db import migrations
+from django.db.models import Count
+
+# Frozen copy of the columns in analytics.services.BREAKDOWN_DIMENSIONS
+DIMENSIONS = ("country", "browser", "os", "device_type", "referrer_host")
+
+
+def backfill_dimension_rollups(apps, schema_editor):
+    ClickEvent = apps.get_model("analytics", "ClickEvent")
+    ClickDimensionRollup = apps.get_model("analytics", "ClickDimensionRollup")
+    alias = schema_editor.connection.alias
+
+    for dimension in DIMENSIONS:
+        rows = (
+            ClickEvent.objects.using(alias)
+            .values("shortened_url_id", dimension)
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        ClickDimensionRollup.objects.using(alias).bulk_create(
+            (
+                ClickDimensionRollup(
+                    shortened_url_id=row["shortened_url_id"],
+                    dimension=dimension,
+                    value=row[dimension],
+                    count=row["count"],
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_clickdimensionrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dimension_rollups, migrations.RunPython.noop),
+        # The breakdowns no longer GROUP BY raw events, so these per-URL
+        # indexes only slow down inserts
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_7bf201_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_31fa3b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_964818_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_f39ccb_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='clickevent',
+            name='analytics_c_shorten_ba292e_idx',
+        ),
+    ]
@@ -1,6 +1,7 @@
 """Models for click analytics tracking."""
 
 from django.db import models
+from django.utils import timezone
 
 
 class ClickEvent(models.Model):
@@ -18,8 +19,10 @@ class ClickEvent(models.Model):
         on_delete=models.CASCADE,
         related_name="clicks",
     )
-    clicked_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    ip_address = models.GenericIPAddressField()
+    # Set from the redirect time, not insert time: events are written in batches
+    clicked_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # NULL when the request's address wasn't a storable IP
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
     country = models.CharField(max_length=2, blank=True, default="")
     city = models.CharField(max_length=100, blank=True, default="")
     browser = models.CharField(max_length=50, blank=True, default="")
@@ -32,6 +35,8 @@ class ClickEvent(models.Model):
         default=DeviceType.UNKNOWN,
     )
     referrer = models.URLField(max_length=2048, blank=True, default="")
+    # Hostname of referrer, the grouping key for the top-referrers breakdown
+    referrer_host = models.CharField(max_length=255, blank=True, default="")
     user_agent = models.TextField(blank=True, default="")
 
     class Meta:
@@ -45,3 +50,59 @@ class ClickEvent(models.Model):
 
     def __str__(self) -> str:
         return f"Click on {self.shortened_url.short_code} at {self.clicked_at}"
+
+
+class ClickDailyRollup(models.Model):
+    """Clicks per URL per day, maintained by the click-event flush."""
+
+    shortened_url = models.ForeignKey(
+        "shortener.ShortenedURL",
+        on_delete=models.CASCADE,
+        related_name="daily_clicks",
+    )
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shortened_url", "date"],
+                name="analytics_daily_rollup_url_date_uniq",
+            ),
+        ]
+        verbose_name = "Daily Click Rollup"
+        verbose_name_plural = "Daily Click Rollups"
+
+    def __str__(self) -> str:
+        return f"{self.shortened_url_id} on {self.date}: {self.count}"
+
+
+class ClickDimensionRollup(models.Model):
+    """Clicks per URL per value of a breakdown column, maintained by the click-event flush.
+
+    ``dimension`` is the ClickEvent column (``country``, ``browser``, ...)
+    and ``value`` its value, so the analytics breakdowns read a handful of
+    rows per URL instead of grouping every raw event.
+    """
+
+    shortened_url = models.ForeignKey(
+        "shortener.ShortenedURL",
+        on_delete=models.CASCADE,
+        related_name="dimension_clicks",
+    )
+    dimension = models.CharField(max_length=20)
+    value = models.CharField(max_length=255, blank=True, default="")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shortened_url", "dimension", "value"],
+                name="analytics_dim_rollup_url_dim_value_uniq",
+            ),
+        ]
+        verbose_name = "Click Dimension Rollup"
+        verbose_name_plural = "Click Dimension Rollups"
+
+    def __str__(self) -> str:
+        return f"{self.shortened_url_id} {self.dimension}={self.value!r}: {self.count}"
@@ -0,0 +1,69 @@
+"""Monthly range partitions of the ClickEvent table (PostgreSQL only).
+
+Migration ``0006_partition_clickevent`` turns ``analytics_clickevent`` into
+a table partitioned by month on ``clicked_at``; ensure_click_partitions() is
+run daily by Celery beat so next month's partition exists before its first
+click arrives. Months are UTC calendar months. A DEFAULT partition catches
+anything outside the created ranges.
+"""
+
+from datetime import date
+
+from django.db import connection as default_connection
+from django.utils import timezone
+
+CLICK_EVENT_TABLE = "analytics_clickevent"
+
+
+def add_months(month_start: date, months: int) -> date:
+    """First day of the month ``months`` after ``month_start``'s month."""
+    index = month_start.month - 1 + months
+    return date(month_start.year + index // 12, index % 12 + 1, 1)
+
+
+def create_month_partitions(
+    cursor, table: str, first_month: date, last_month: date, quote_name
+) -> list[str]:
+    """Create the missing monthly partitions from first_month to last_month inclusive.
+
+    Returns the names of the partitions that were created.
+    """
+    created = []
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        name = f"{table}_{month:%Y_%m}"
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                f"CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+                f"TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+            )
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def ensure_click_partitions(months_ahead: int = 2, connection=default_connection) -> list[str]:
+    """Make sure ClickEvent has partitions through ``months_ahead`` months from now.
+
+    A no-op on databases other than PostgreSQL, which keep a plain table.
+    """
+    if connection.vendor != "postgresql":
+        return []
+    this_month = timezone.now().date().replace(day=1)
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, CLICK_EVENT_TABLE):
+            return []
+        return create_month_partitions(
+            cursor,
+            CLICK_EVENT_TABLE,
+            this_month,
+            add_months(this_month, months_ahead),
+            connection.ops.quote_name,
+        )
@@ -1,36 +1,197 @@
 """Analytics tracking service."""
 
+import hashlib
+import ipaddress
+import json
 import logging
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from urllib.parse import urlsplit
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.utils import timezone
 from user_agents import parse as parse_ua
 
+from config.redis_client import get_redis, redis_lock
 from shortener.models import ShortenedURL
 from shortener.services import increment_click_count
 
-from .models import ClickEvent
+from .models import ClickDailyRollup, ClickDimensionRollup, ClickEvent
 
 logger = logging.getLogger(__name__)
 
+# Redis list of JSON-encoded clicks waiting to be bulk-inserted (newest first)
+CLICK_BUFFER_KEY = "clicks:buffer"
+# The batch being flushed; it is only deleted once its rows have committed
+CLICK_PROCESSING_KEY = "clicks:buffer:processing"
+CLICK_FLUSH_LOCK_KEY = "clicks:buffer:flush-lock"
+CLICK_FLUSH_LOCK_TIMEOUT = 5 * 60
+# A batch that fails this many flushes in a row is moved to the dead-letter
+# list (newest first, like the buffer) so it can't block later clicks
+CLICK_FLUSH_MAX_ATTEMPTS = 3
+CLICK_FLUSH_FAILURES_KEY = "clicks:buffer:processing:failures"
+CLICK_DEAD_LETTER_KEY = "clicks:buffer:dead"
+CLICK_FLUSH_BATCH_SIZE = 500
+
+# Per-URL HyperLogLog of visitor IPs (~0.81% standard error, 12 KB max)
+UNIQUE_VISITORS_KEY = "clicks:uv:{}"
+
+# Repeat hits from one IP on one URL within this many seconds (reloads,
+# double-clicks, link-preview fetchers) are dropped
+CLICK_DEDUP_SECONDS = 5
+RECENT_CLICK_KEY = "clicks:recent:{}:{}"
+
+# Hashes of User-Agents classified as bots; their hits only bump a counter
+BOT_UA_HASHES_KEY = "clicks:bot_ua_hashes"
+BOT_CLICKS_KEY = "clicks:bots:{}"
+
+# Seconds the per-URL analytics aggregations are served from cache; the
+# click flush invalidates a URL's entry as soon as new events land
+ANALYTICS_CACHE_TIMEOUT = 60 * 60
+
 
 def get_client_ip(request) -> str:
     """Extract the real client IP from the request."""
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        return x_forwarded_for.split(",")[0].strip()
-    return request.META.get("REMOTE_ADDR", "0.0.0.0")
+    return resolve_client_ip(
+        request.META.get("REMOTE_ADDR", ""),
+        request.META.get("HTTP_X_FORWARDED_FOR", ""),
+    )
+
+
+def resolve_client_ip(remote_addr: str, forwarded_for: str = "") -> str:
+    """Pick the client IP from raw ``REMOTE_ADDR`` / ``X-Forwarded-For`` values.
+
+    A forwarded value that isn't an IP address is ignored, since it would be
+    rejected by the ``inet`` column when the click is flushed.
+    """
+    if forwarded_for:
+        candidate = forwarded_for.split(",")[0].strip()
+        try:
+            ipaddress.ip_address(candidate)
+        except ValueError:
+            pass
+        else:
+            return candidate
+    return remote_addr or "0.0.0.0"
+
+
+def storable_ip(ip_address: str) -> str | None:
+    """Normalize an address for ClickEvent.ip_address, or None if it isn't an IP.
+
+    IPv6 zone IDs (``fe80::1%eth0``) are dropped; the ``inet`` column
+    rejects them.
+    """
+    try:
+        ip = ipaddress.ip_address(ip_address.partition("%")[0])
+    except ValueError:
+        return None
+    return str(ip)
+
+
+def referrer_host(referrer: str) -> str:
+    """Hostname of a Referer header value ("" if absent or unparseable)."""
+    try:
+        return (urlsplit(referrer).hostname or "")[:255]
+    except ValueError:
+        return ""
+
+
+_UA_FIELDS = ("browser", "browser_version", "os", "os_version", "device_type")
 
 
 def parse_user_agent(ua_string: str) -> dict:
     """Parse a User-Agent string into structured data."""
+    return dict(zip(_UA_FIELDS, _parse_user_agent(ua_string), strict=True))
+
+
+@lru_cache(maxsize=4096)
+def _parse_user_agent(ua_string: str) -> tuple[str, str, str, str, str]:
+    """Classify a User-Agent once per distinct string.
+
+    UA strings repeat heavily across visitors on the same browser build, so
+    results are memoized as plain-string tuples to keep cache entries small.
+    """
     if not ua_string:
-        return {
-            "browser": "",
-            "browser_version": "",
-            "os": "",
-            "os_version": "",
-            "device_type": ClickEvent.DeviceType.UNKNOWN,
-        }
+        return ("", "", "", "", ClickEvent.DeviceType.UNKNOWN.value)
+    return _fast_parse_user_agent(ua_string) or _parse_with_ua_parser(ua_string)
+
+
+# Exact platform tokens of the most common desktop UAs -> (os, os_version)
+_DESKTOP_PLATFORMS = {
+    "Windows NT 10.0; Win64; x64": ("Windows", "10"),
+    "Windows NT 10.0": ("Windows", "10"),
+    "Macintosh; Intel Mac OS X 10_15_7": ("Mac OS X", "10.15.7"),
+    "Macintosh; Intel Mac OS X 10.15": ("Mac OS X", "10.15"),
+    "X11; Linux x86_64": ("Linux", ""),
+}
+_CHROME_PREFIX = "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/"
+_FIREFOX_PREFIX = "Gecko/20100101 Firefox/"
+_IOS_SAFARI_PREFIX = "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/"
+
+
+def _is_version(value: str, max_parts: int = 4) -> bool:
+    parts = value.split(".")
+    return len(parts) <= max_parts and all(p.isascii() and p.isdigit() for p in parts)
 
+
+def _fast_parse_user_agent(ua_string: str) -> tuple[str, str, str, str, str] | None:
+    """Classify the handful of UA shapes that make up most traffic without regex.
+
+    Covers current desktop Chrome/Firefox, Android Chrome (reduced UA) and
+    iPhone Safari, matching exactly what ua-parser reports for them. Anything
+    else — including every close variant — returns None and falls back to
+    ua-parser.
+    """
+    if not ua_string.startswith("Mozilla/5.0 ("):
+        return None
+    platform, sep, product = ua_string[13:].partition(") ")
+    if not sep:
+        return None
+
+    if product.startswith(_CHROME_PREFIX):
+        version, _, rest = product[len(_CHROME_PREFIX):].partition(" ")
+        # Chrome always sends a four-part version; ua-parser keeps three
+        if version.count(".") != 3 or not _is_version(version):
+            return None
+        version = ".".join(version.split(".")[:3])
+        if rest == "Safari/537.36" and platform in _DESKTOP_PLATFORMS:
+            return ("Chrome", version, *_DESKTOP_PLATFORMS[platform], ClickEvent.DeviceType.DESKTOP.value)
+        if rest == "Mobile Safari/537.36" and platform.startswith("Linux; Android ") and platform.endswith("; K"):
+            android = platform[15:-3]
+            if android.isascii() and android.isdigit():
+                return ("Chrome Mobile", version, "Android", android, ClickEvent.DeviceType.MOBILE.value)
+        return None
+
+    if product.startswith(_FIREFOX_PREFIX):
+        version = product[len(_FIREFOX_PREFIX):]
+        platform, sep, _ = platform.rpartition("; rv:")
+        if sep and platform in _DESKTOP_PLATFORMS and _is_version(version, max_parts=3) and "." in version:
+            return ("Firefox", version, *_DESKTOP_PLATFORMS[platform], ClickEvent.DeviceType.DESKTOP.value)
+        return None
+
+    if (
+        product.startswith(_IOS_SAFARI_PREFIX)
+        and platform.startswith("iPhone; CPU iPhone OS ")
+        and platform.endswith(" like Mac OS X")
+    ):
+        version, _, rest = product[len(_IOS_SAFARI_PREFIX):].partition(" ")
+        ios = platform[22:-14].replace("_", ".")
+        if (
+            rest.startswith("Mobile/")
+            and rest.endswith(" Safari/604.1")
+            and " " not in rest[7:-13]
+            and _is_version(version, max_parts=3)
+            and _is_version(ios, max_parts=3)
+        ):
+            return ("Mobile Safari", version, "iOS", ios, ClickEvent.DeviceType.MOBILE.value)
+    return None
+
+
+def _parse_with_ua_parser(ua_string: str) -> tuple[str, str, str, str, str]:
+    """Run the full ua-parser regex cascade."""
     ua = parse_ua(ua_string)
 
     if ua.is_bot:
@@ -44,13 +205,27 @@ def parse_user_agent(ua_string: str) -> dict:
     else:
         device_type = ClickEvent.DeviceType.UNKNOWN
 
-    return {
-        "browser": ua.browser.family or "",
-        "browser_version": ua.browser.version_string or "",
-        "os": ua.os.family or "",
-        "os_version": ua.os.version_string or "",
-        "device_type": device_type,
-    }
+    return (
+        ua.browser.family or "",
+        ua.browser.version_string or "",
+        ua.os.family or "",
+        ua.os.version_string or "",
+        device_type.value,
+    )
+
+
+def _load_geoip():
+    """Open the GeoIP2 database once; returns None if GeoIP isn't configured."""
+    try:
+        from django.contrib.gis.geoip2 import GeoIP2
+
+        return GeoIP2()
+    except Exception:
+        return None
+
+
+# maxminddb's mmap reader is thread-safe, so one instance serves every click
+_GEOIP = _load_geoip()
 
 
 def get_geo_data(ip_address: str) -> dict:
@@ -58,44 +233,93 @@ def get_geo_data(ip_address: str) -> dict:
 
     Uses Django's built-in GeoIP2 if available; otherwise returns empty data.
     """
+    if _GEOIP is None:
+        return {"country": "", "city": ""}
     try:
-        from django.contrib.gis.geoip2 import GeoIP2
-
-        g = GeoIP2()
-        data = g.city(ip_address)
+        data = _GEOIP.city(ip_address)
         return {
             "country": (data.get("country_code") or "")[:2],
             "city": (data.get("city") or "")[:100],
         }
     except Exception:
-        # GeoIP not configured or IP not found — degrade gracefully
+        # IP not found (private/reserved range) — degrade gracefully
         return {"country": "", "city": ""}
 
 
-def track_click(request, shortened_url: ShortenedURL) -> ClickEvent:
-    """Record a click event for a shortened URL.
+def track_click(request, shortened_url: ShortenedURL) -> ClickEvent | None:
+    """Record a click event for a shortened URL from the current request.
+
+    Runs synchronously; the redirect view enqueues
+    ``analytics.tasks.track_click_task`` instead so the response isn't held up.
+    """
+    return record_click(
+        shortened_url.pk,
+        ip_address=get_client_ip(request),
+        ua_string=request.META.get("HTTP_USER_AGENT", ""),
+        referrer=request.META.get("HTTP_REFERER", ""),
+    )
+
+
+def record_click(
+    shortened_url_id,
+    ip_address: str,
+    ua_string: str = "",
+    referrer: str = "",
+    clicked_at: datetime | None = None,
+) -> ClickEvent | None:
+    """Record a click event from primitive request data.
 
     This function:
-    1. Extracts client info (IP, User-Agent, referrer)
-    2. Parses the User-Agent for browser/OS/device info
-    3. Looks up geographic data from IP
-    4. Creates a ClickEvent record
-    5. Increments the denormalized click counter
+    1. Drops repeat hits from the same IP within CLICK_DEDUP_SECONDS
+    2. Diverts known bots to a per-URL counter (no ClickEvent, no click_count)
+    3. Parses the User-Agent for browser/OS/device info
+    4. Looks up geographic data from IP
+    5. Buffers the ClickEvent in Redis for flush_click_events()
+    6. Adds the IP to the URL's unique-visitor HyperLogLog
+    7. Increments the denormalized click counter
+
+    Returns the (unsaved) ClickEvent that was buffered, or None for a
+    duplicate or a bot.
     """
-    ip_address = get_client_ip(request)
-    ua_string = request.META.get("HTTP_USER_AGENT", "")
-    referrer = request.META.get("HTTP_REFERER", "")
+    r = get_redis()
+    ua_hash = _ua_hash(ua_string)
+
+    # Both checks share one round trip; SET NX is atomic, so the dedup
+    # window holds across every worker
+    with r.pipeline(transaction=False) as pipe:
+        pipe.set(
+            RECENT_CLICK_KEY.format(shortened_url_id, ip_address),
+            1,
+            nx=True,
+            ex=CLICK_DEDUP_SECONDS,
+        )
+        pipe.sismember(BOT_UA_HASHES_KEY, ua_hash)
+        first_hit, known_bot = pipe.execute()
+    if not first_hit:
+        return None
+
+    # Bots are counted, not stored
+    if ua_string and known_bot:
+        r.incr(BOT_CLICKS_KEY.format(shortened_url_id))
+        return None
 
     # Parse user agent
     ua_data = parse_user_agent(ua_string)
+    if ua_data["device_type"] == ClickEvent.DeviceType.BOT:
+        with r.pipeline(transaction=False) as pipe:
+            pipe.sadd(BOT_UA_HASHES_KEY, ua_hash)
+            pipe.incr(BOT_CLICKS_KEY.format(shortened_url_id))
+            pipe.execute()
+        return None
 
     # Geo lookup (gracefully degrades if not configured)
-    geo_data = get_geo_data(ip_address)
+    stored_ip = storable_ip(ip_address)
+    geo_data = get_geo_data(stored_ip) if stored_ip else {"country": "", "city": ""}
 
-    # Create click event
-    click = ClickEvent.objects.create(
-        shortened_url=shortened_url,
-        ip_address=ip_address,
+    click = ClickEvent(
+        shortened_url_id=shortened_url_id,
+        clicked_at=clicked_at or timezone.now(),
+        ip_address=stored_ip,
         country=geo_data["country"],
         city=geo_data["city"],
         browser=ua_data["browser"],
@@ -103,11 +327,326 @@ def track_click(request, shortened_url: ShortenedURL) -> ClickEvent:
         os=ua_data["os"],
         os_version=ua_data["os_version"],
         device_type=ua_data["device_type"],
-        referrer=referrer[:2048] if referrer else "",
+        referrer=referrer,
+        referrer_host=referrer_host(referrer) if referrer else "",
         user_agent=ua_string,
     )
+    # A NUL byte (rejected by PostgreSQL) or an over-long value would fail
+    # the whole batch it is flushed with
+    for name, max_length in _CLICK_TEXT_FIELDS:
+        setattr(click, name, getattr(click, name).replace("\x00", "")[:max_length])
 
-    # Increment denormalized counter
-    increment_click_count(shortened_url)
+    # Write-behind: one bulk INSERT per batch instead of one per click. The
+    # buffer, visitor HLL and click counter go out in a single round trip.
+    with r.pipeline(transaction=False) as pipe:
+        pipe.lpush(CLICK_BUFFER_KEY, _serialize_click(click))
+        pipe.pfadd(UNIQUE_VISITORS_KEY.format(shortened_url_id), ip_address)
+        increment_click_count(shortened_url_id, pipe=pipe)
+        pipe.execute()
 
     return click
+
+
+# (attname, max_length or None) of every text column on ClickEvent
+_CLICK_TEXT_FIELDS = tuple(
+    (field.attname, field.max_length)
+    for field in ClickEvent._meta.concrete_fields
+    if isinstance(field, (models.CharField, models.TextField))
+)
+
+
+def _ua_hash(ua_string: str) -> str:
+    return hashlib.blake2b(ua_string.encode(), digest_size=8).hexdigest()
+
+
+def sync_bot_ua_hashes(batch_size: int = 1000) -> int:
+    """Add the User-Agents of stored bot clicks to the Redis bot set.
+
+    New bots are added as they're first classified; this daily job covers
+    clicks stored before bots were diverted and a Redis that lost its data.
+    Returns the number of distinct bot User-Agents seen.
+    """
+    r = get_redis()
+    user_agents = (
+        ClickEvent.objects.filter(device_type=ClickEvent.DeviceType.BOT)
+        .values_list("user_agent", flat=True)
+        .distinct()
+        .order_by()
+        .iterator(chunk_size=batch_size)
+    )
+    seen = 0
+    hashes = []
+    for ua_string in user_agents:
+        hashes.append(_ua_hash(ua_string))
+        seen += 1
+        if len(hashes) == batch_size:
+            r.sadd(BOT_UA_HASHES_KEY, *hashes)
+            hashes = []
+    if hashes:
+        r.sadd(BOT_UA_HASHES_KEY, *hashes)
+    return seen
+
+
+def _serialize_click(click: ClickEvent) -> str:
+    return json.dumps(
+        {
+            "shortened_url_id": str(click.shortened_url_id),
+            "clicked_at": click.clicked_at.isoformat(),
+            "ip_address": click.ip_address,
+            "country": click.country,
+            "city": click.city,
+            "browser": click.browser,
+            "browser_version": click.browser_version,
+            "os": click.os,
+            "os_version": click.os_version,
+            "device_type": click.device_type,
+            "referrer": click.referrer,
+            "referrer_host": click.referrer_host,
+            "user_agent": click.user_agent,
+        }
+    )
+
+
+def _deserialize_click(payload: str) -> ClickEvent:
+    data = json.loads(payload)
+    data["clicked_at"] = datetime.fromisoformat(data["clicked_at"])
+    return ClickEvent(**data)
+
+
+def flush_click_events(batch_size: int = CLICK_FLUSH_BATCH_SIZE) -> int:
+    """Bulk-insert buffered clicks from Redis into ClickEvent.
+
+    Each batch is moved oldest-first from the buffer onto a processing list
+    with LMOVE, so concurrent LPUSHes are never dropped, and the processing
+    list is deleted only after the batch's transaction commits. A batch left
+    behind by a failed run is retried before a new one is taken, and moved
+    to CLICK_DEAD_LETTER_KEY once it has failed CLICK_FLUSH_MAX_ATTEMPTS
+    times in a row. A Redis lock keeps overlapping runs from inserting the
+    same batch twice. Clicks
+    are eventually consistent: they appear in analytics once the next flush
+    runs.
+
+    Returns the number of events written.
+    """
+    r = get_redis()
+    written = 0
+    with redis_lock(CLICK_FLUSH_LOCK_KEY, CLICK_FLUSH_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            return 0
+        while True:
+            payloads = r.lrange(CLICK_PROCESSING_KEY, 0, -1)[::-1]
+            retried = bool(payloads)
+            if not retried:
+                with r.pipeline(transaction=False) as pipe:
+                    for _ in range(batch_size):
+                        pipe.lmove(CLICK_BUFFER_KEY, CLICK_PROCESSING_KEY, "RIGHT", "LEFT")
+                    payloads = [payload for payload in pipe.execute() if payload is not None]
+            if not payloads:
+                break
+
+            try:
+                written += _write_click_batch(payloads, batch_size)
+            except Exception:
+                failures = r.incr(CLICK_FLUSH_FAILURES_KEY)
+                if failures < CLICK_FLUSH_MAX_ATTEMPTS:
+                    raise
+                logger.exception(
+                    "Moving %d buffered clicks to %s after %d failed flushes",
+                    len(payloads),
+                    CLICK_DEAD_LETTER_KEY,
+                    failures,
+                )
+                with r.pipeline(transaction=True) as pipe:
+                    pipe.lpush(CLICK_DEAD_LETTER_KEY, *payloads)
+                    pipe.delete(CLICK_PROCESSING_KEY, CLICK_FLUSH_FAILURES_KEY)
+                    pipe.execute()
+                continue
+            r.delete(CLICK_PROCESSING_KEY, CLICK_FLUSH_FAILURES_KEY)
+
+            if not retried and len(payloads) < batch_size:
+                break
+    return written
+
+
+def _write_click_batch(payloads: list[str], batch_size: int) -> int:
+    """Insert one batch of buffered clicks (oldest first) and update the rollups."""
+    clicks = [_deserialize_click(payload) for payload in payloads]
+
+    # Skip clicks whose URL was hard-deleted while buffered
+    live_ids = {
+        str(pk)
+        for pk in ShortenedURL.objects.filter(
+            pk__in={c.shortened_url_id for c in clicks}
+        ).values_list("pk", flat=True)
+    }
+    clicks = [c for c in clicks if c.shortened_url_id in live_ids]
+
+    with transaction.atomic():
+        ClickEvent.objects.bulk_create(clicks, batch_size=batch_size)
+        _add_rollup_counts(
+            ClickDailyRollup,
+            ("date",),
+            Counter((c.shortened_url_id, _click_date(c)) for c in clicks),
+        )
+        _add_rollup_counts(
+            ClickDimensionRollup,
+            ("dimension", "value"),
+            Counter(
+                (c.shortened_url_id, column, getattr(c, column))
+                for c in clicks
+                for _, column, _ in BREAKDOWN_DIMENSIONS
+            ),
+        )
+    # One invalidation per URL per batch rather than per event
+    cache.delete_many([_stats_cache_key(pk) for pk in {c.shortened_url_id for c in clicks}])
+    return len(clicks)
+
+
+def _click_date(click: ClickEvent) -> date:
+    """The day a click is bucketed under, matching TruncDate in the current timezone."""
+    if settings.USE_TZ:
+        return timezone.localdate(click.clicked_at)
+    return click.clicked_at.date()
+
+
+def _add_rollup_counts(model, key_columns: tuple[str, ...], counts: Counter) -> None:
+    """Add per-URL click counts to a rollup table with one upsert.
+
+    ``counts`` is keyed by ``(shortened_url_id, *key_columns)`` tuples; rows
+    that already exist have the new count added to theirs.
+    """
+    if not counts:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk_field = ShortenedURL._meta.pk
+    keys = ", ".join(["shortened_url_id", *map(qn, key_columns)])
+    params = []
+    for (url_id, *key), count in counts.items():
+        params += [pk_field.get_db_prep_value(url_id, connection), *key, count]
+    row = "(" + ", ".join(["%s"] * (len(key_columns) + 2)) + ")"
+    values = ", ".join([row] * len(counts))
+    sql = (
+        f"INSERT INTO {table} ({keys}, {qn('count')}) VALUES {values} "
+        f"ON CONFLICT ({keys}) "
+        f"DO UPDATE SET {qn('count')} = {table}.{qn('count')} + EXCLUDED.{qn('count')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def seed_unique_visitors(batch_size: int = 10_000) -> int:
+    """Load the distinct IPs already in ClickEvent into the per-URL HyperLogLogs.
+
+    Needed once for clicks recorded before unique visitors moved to Redis;
+    PFADD is idempotent, so re-running it is harmless. Returns the number of
+    (URL, IP) pairs added.
+    """
+    r = get_redis()
+    pairs = (
+        ClickEvent.objects.filter(ip_address__isnull=False)
+        .values_list("shortened_url_id", "ip_address")
+        .distinct()
+        .order_by()
+        .iterator(chunk_size=batch_size)
+    )
+    added = 0
+    with r.pipeline(transaction=False) as pipe:
+        for url_id, ip_address in pairs:
+            pipe.pfadd(UNIQUE_VISITORS_KEY.format(url_id), ip_address)
+            added += 1
+            if added % batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+    return added
+
+
+def get_click_stats(shortened_url: ShortenedURL, refresh: bool = False) -> dict:
+    """Return click aggregations for a URL (cache-aside).
+
+    Results are cached until flush_click_events() writes new clicks for the
+    URL (or ANALYTICS_CACHE_TIMEOUT seconds pass); pass ``refresh=True`` to
+    recompute immediately. Bot hits never pass through the flush, so their
+    counter is read fresh on every call instead of being cached.
+    """
+    cache_key = _stats_cache_key(shortened_url.pk)
+    stats = None if refresh else cache.get(cache_key)
+    if stats is None:
+        stats = _aggregate_clicks(shortened_url)
+        cache.set(cache_key, stats, ANALYTICS_CACHE_TIMEOUT)
+    bot_clicks = get_redis().get(BOT_CLICKS_KEY.format(shortened_url.pk))
+    return {**stats, "bot_clicks": int(bot_clicks or 0)}
+
+
+def _stats_cache_key(shortened_url_id) -> str:
+    return f"analytics:v2:{shortened_url_id}"
+
+
+# (stats key, ClickEvent column, top-N limit or None for all values). The
+# click flush counts each column into ClickDimensionRollup; a new column
+# needs its existing events backfilled there.
+BREAKDOWN_DIMENSIONS = (
+    ("top_countries", "country", 10),
+    ("top_browsers", "browser", 10),
+    ("top_os", "os", 10),
+    ("top_devices", "device_type", None),
+    ("top_referrers", "referrer_host", 10),
+)
+
+
+def _aggregate_clicks(shortened_url: ShortenedURL) -> dict:
+    """Compute every analytics aggregation in a single query.
+
+    Clicks per day come from ClickDailyRollup. Every breakdown comes from
+    one pass over the URL's ClickDimensionRollup rows, ranked per dimension
+    with ROW_NUMBER() so each keeps only its top N, instead of a separate
+    sorted lookup per chart. Unique visitors are a PFCOUNT rather than a
+    COUNT(DISTINCT).
+    """
+    qn = connection.ops.quote_name
+    url_id = ShortenedURL._meta.pk.get_db_prep_value(shortened_url.pk, connection)
+    value_col, count_col = qn("value"), qn("count")
+
+    dimensions = ", ".join(f"'{column}'" for _, column, _ in BREAKDOWN_DIMENSIONS)
+    # Capped dimensions skip blank values, uncapped ones list every value
+    uncapped = [f"'{column}'" for _, column, limit in BREAKDOWN_DIMENSIONS if not limit]
+    value_filter = f"{value_col} <> ''"
+    if uncapped:
+        value_filter = f"({value_filter} OR dimension IN ({', '.join(uncapped)}))"
+    limits = " ".join(
+        f"WHEN '{column}' THEN {int(limit)}" for _, column, limit in BREAKDOWN_DIMENSIONS if limit
+    )
+
+    sql = (
+        f"SELECT 'clicks_by_day' AS dim, CAST({qn('date')} AS TEXT) AS val, {count_col} AS n "
+        f"FROM {qn(ClickDailyRollup._meta.db_table)} WHERE shortened_url_id = %s "
+        "UNION ALL "
+        "SELECT dim, val, n FROM ("
+        f"SELECT dimension AS dim, {value_col} AS val, {count_col} AS n, "
+        f"ROW_NUMBER() OVER (PARTITION BY dimension ORDER BY {count_col} DESC) AS pos "
+        f"FROM {qn(ClickDimensionRollup._meta.db_table)} "
+        f"WHERE shortened_url_id = %s AND dimension IN ({dimensions}) AND {value_filter}"
+        f") AS ranked WHERE pos <= CASE dim {limits} ELSE pos END"
+    )
+    params = [url_id, url_id]
+
+    stats = {
+        "unique_visitors": get_redis().pfcount(UNIQUE_VISITORS_KEY.format(shortened_url.pk)),
+        "clicks_by_day": [],
+    }
+    stats.update({key: [] for key, _, _ in BREAKDOWN_DIMENSIONS})
+    keys = {column: key for key, column, _ in BREAKDOWN_DIMENSIONS}
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for dim, value, count in cursor.fetchall():
+            if dim == "clicks_by_day":
+                stats["clicks_by_day"].append({"date": date.fromisoformat(value), "count": count})
+            else:
+                stats[keys[dim]].append({dim: value, "count": count})
+
+    # Neither UNION ALL nor the window guarantees output order
+    stats["clicks_by_day"].sort(key=lambda item: item["date"])
+    for key, _, _ in BREAKDOWN_DIMENSIONS:
+        stats[key].sort(key=lambda item: -item["count"])
+    return stats
@@ -0,0 +1,54 @@
+"""Celery tasks for the analytics app."""
+
+from datetime import datetime
+
+from celery import shared_task
+
+from .partitions import ensure_click_partitions
+from .services import (
+    flush_click_events,
+    record_click,
+    resolve_client_ip,
+    sync_bot_ua_hashes,
+)
+
+
+@shared_task
+def track_click_task(
+    short_url_id: str,
+    ip: str,
+    ua: str = "",
+    referer: str = "",
+    forwarded_for: str = "",
+    clicked_at: str | None = None,
+) -> None:
+    """Record a click off the request path.
+
+    Receives raw ``request.META`` values (and the ISO-8601 redirect time)
+    rather than the request or model so the payload stays JSON-serializable.
+    """
+    record_click(
+        short_url_id,
+        ip_address=resolve_client_ip(ip, forwarded_for),
+        ua_string=ua,
+        referrer=referer,
+        clicked_at=datetime.fromisoformat(clicked_at) if clicked_at else None,
+    )
+
+
+@shared_task
+def flush_click_events_task() -> int:
+    """Periodic (Celery beat) bulk insert of buffered clicks."""
+    return flush_click_events()
+
+
+@shared_task
+def sync_bot_ua_hashes_task() -> int:
+    """Daily (Celery beat) refresh of the Redis bot User-Agent set."""
+    return sync_bot_ua_hashes()
+
+
+@shared_task
+def ensure_click_partitions_task() -> list[str]:
+    """Daily (Celery beat) creation of upcoming monthly ClickEvent partitions."""
+    return ensure_click_partitions()
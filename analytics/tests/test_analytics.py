@@ -1,11 +1,40 @@
 """Tests for analytics services."""
 
+import io
+import json
+from datetime import UTC, date, datetime
+
 import pytest
-from django.test import RequestFactory
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import Client, RequestFactory
+from django.utils import timezone
 
-from analytics.models import ClickEvent
-from analytics.services import get_client_ip, parse_user_agent, track_click
+from analytics import services
+from analytics.models import ClickDailyRollup, ClickDimensionRollup, ClickEvent
+from analytics.partitions import (
+    CLICK_EVENT_TABLE,
+    add_months,
+    ensure_click_partitions,
+    is_partitioned,
+)
+from analytics.services import (
+    flush_click_events,
+    get_click_stats,
+    get_client_ip,
+    get_geo_data,
+    parse_user_agent,
+    record_click,
+    seed_unique_visitors,
+    storable_ip,
+    sync_bot_ua_hashes,
+    track_click,
+)
+from analytics.tasks import track_click_task
 from shortener.models import ShortenedURL
+from shortener.services import flush_click_counts
 
 
 class TestGetClientIP:
@@ -22,6 +51,22 @@ class TestGetClientIP:
         request.META["HTTP_X_FORWARDED_FOR"] = "10.0.0.1, 192.168.1.1"
         assert get_client_ip(request) == "10.0.0.1"
 
+    def test_ignores_invalid_x_forwarded_for(self):
+        request = self.factory.get("/")
+        request.META["REMOTE_ADDR"] = "192.168.1.1"
+        request.META["HTTP_X_FORWARDED_FOR"] = "unknown, 10.0.0.1"
+        assert get_client_ip(request) == "192.168.1.1"
+
+
+class TestStorableIP:
+    def test_valid(self):
+        assert storable_ip("192.168.1.1") == "192.168.1.1"
+        assert storable_ip("fe80::1%eth0") == "fe80::1"
+
+    def test_invalid(self):
+        assert storable_ip("unknown") is None
+        assert storable_ip("") is None
+
 
 class TestParseUserAgent:
     def test_chrome_desktop(self):
@@ -42,6 +87,45 @@ class TestParseUserAgent:
         assert result["browser"] == ""
         assert result["device_type"] == ClickEvent.DeviceType.UNKNOWN
 
+    def test_fast_path_matches_ua_parser(self):
+        uas = [
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.6099.109 Safari/537.36",
+            "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36",
+            "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+            "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1.2 Mobile/15E148 Safari/604.1",
+        ]
+        for ua in uas:
+            fast = services._fast_parse_user_agent(ua)
+            assert fast is not None
+            assert fast == services._parse_with_ua_parser(ua)
+
+    def test_unusual_ua_falls_back(self):
+        ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+        assert services._fast_parse_user_agent(ua) is None
+        assert parse_user_agent(ua)["browser"] == "Edge"
+
+    def test_repeated_ua_is_cached(self):
+        ua = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+        first = parse_user_agent(ua)
+        hits = services._parse_user_agent.cache_info().hits
+        assert parse_user_agent(ua) == first
+        assert services._parse_user_agent.cache_info().hits == hits + 1
+
+
+class TestGetGeoData:
+    def test_without_geoip_database(self, monkeypatch):
+        monkeypatch.setattr(services, "_GEOIP", None)
+        assert get_geo_data("8.8.8.8") == {"country": "", "city": ""}
+
+    def test_uses_shared_reader(self, monkeypatch):
+        class FakeGeoIP:
+            def city(self, ip):
+                return {"country_code": "US", "city": "Mountain View"}
+
+        monkeypatch.setattr(services, "_GEOIP", FakeGeoIP())
+        assert get_geo_data("8.8.8.8") == {"country": "US", "city": "Mountain View"}
+
 
 @pytest.mark.django_db
 class TestTrackClick:
@@ -63,8 +147,10 @@ class TestTrackClick:
         assert click is not None
         assert click.ip_address == "192.168.1.1"
         assert click.referrer == "https://google.com"
-        assert ClickEvent.objects.filter(shortened_url=url).count() == 1
+        assert click.referrer_host == "google.com"
+        assert flush_click_events() == 1
 
+        flush_click_counts()
         url.refresh_from_db()
         assert url.click_count == 1
 
@@ -74,11 +160,415 @@ class TestTrackClick:
             short_code="track2",
         )
         request = self.factory.get(f"/{url.short_code}")
-        request.META["REMOTE_ADDR"] = "192.168.1.1"
-
-        for _ in range(5):
+        for i in range(5):
+            request.META["REMOTE_ADDR"] = f"192.168.1.{i}"
             track_click(request, url)
 
+        flush_click_counts()
         url.refresh_from_db()
         assert url.click_count == 5
+        assert flush_click_events() == 5
+        assert ClickEvent.objects.filter(shortened_url=url).count() == 5
+
+    def test_clicks_are_buffered_until_flush(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track3",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        request.META["REMOTE_ADDR"] = "192.168.1.1"
+
+        click = track_click(request, url)
+
+        assert not ClickEvent.objects.exists()
+        flush_click_events()
+        assert ClickEvent.objects.get().clicked_at == click.clicked_at
+
+    def test_flush_in_batches(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track4",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        for i in range(5):
+            request.META["REMOTE_ADDR"] = f"192.168.1.{i}"
+            track_click(request, url)
+
+        assert flush_click_events(batch_size=2) == 5
+        assert flush_click_events(batch_size=2) == 0
         assert ClickEvent.objects.filter(shortened_url=url).count() == 5
+
+    def test_failed_flush_keeps_batch(self, monkeypatch):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track6",
+        )
+        for i in range(3):
+            record_click(url.pk, ip_address=f"192.168.1.{i}")
+
+        def fail(*args, **kwargs):
+            raise DatabaseError("insert failed")
+
+        with monkeypatch.context() as m:
+            m.setattr(ClickEvent.objects, "bulk_create", fail)
+            with pytest.raises(DatabaseError):
+                flush_click_events(batch_size=2)
+
+        assert flush_click_events(batch_size=2) == 3
+        assert ClickEvent.objects.filter(shortened_url=url).count() == 3
+
+    def test_poison_batch_is_dead_lettered(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track9",
+        )
+        redis.lpush(services.CLICK_BUFFER_KEY, "not a click")
+        for _ in range(services.CLICK_FLUSH_MAX_ATTEMPTS - 1):
+            with pytest.raises(ValueError):
+                flush_click_events()
+
+        record_click(url.pk, ip_address="192.168.1.1")
+        assert flush_click_events() == 1
+        assert ClickEvent.objects.filter(shortened_url=url).count() == 1
+        assert redis.lrange(services.CLICK_DEAD_LETTER_KEY, 0, -1) == ["not a click"]
+        assert not redis.exists(services.CLICK_FLUSH_FAILURES_KEY)
+
+    def test_unstorable_values_are_cleaned(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track10",
+        )
+        click = record_click(
+            url.pk,
+            ip_address="not-an-ip",
+            ua_string="curl/8.0\x00",
+            referrer="https://example.com/\x00",
+        )
+        assert click.ip_address is None
+        assert "\x00" not in click.user_agent + click.referrer
+        assert flush_click_events() == 1
+
+    def test_flush_skipped_while_locked(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track7",
+        )
+        record_click(url.pk, ip_address="192.168.1.1")
+
+        redis.set(services.CLICK_FLUSH_LOCK_KEY, "other-worker")
+        assert flush_click_events() == 0
+        redis.delete(services.CLICK_FLUSH_LOCK_KEY)
+        assert flush_click_events() == 1
+
+    def test_long_values_are_truncated(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track8",
+        )
+        click = record_click(
+            url.pk,
+            ip_address="192.168.1.1",
+            ua_string="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+            "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 "
+            "Edg/123456789012.123456789012.1234567890",
+        )
+        assert click.browser_version == "123456789012.1234567"
+        assert flush_click_events() == 1
+
+    def test_flush_skips_deleted_urls(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track5",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        request.META["REMOTE_ADDR"] = "192.168.1.1"
+        track_click(request, url)
+        url.delete()
+
+        assert flush_click_events() == 0
+
+    def test_repeat_hits_are_deduplicated(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track9",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        request.META["REMOTE_ADDR"] = "192.168.1.1"
+
+        assert track_click(request, url) is not None
+        assert track_click(request, url) is None
+        redis.delete(services.RECENT_CLICK_KEY.format(url.pk, "192.168.1.1"))
+        assert track_click(request, url) is not None
+        assert flush_click_events() == 2
+
+    def test_bots_are_counted_not_stored(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track7",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        request.META["REMOTE_ADDR"] = "66.249.66.1"
+        request.META["HTTP_USER_AGENT"] = (
+            "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+        )
+
+        assert track_click(request, url) is None
+        request.META["REMOTE_ADDR"] = "66.249.66.2"
+        assert track_click(request, url) is None
+
+        assert flush_click_events() == 0
+        assert redis.scard(services.BOT_UA_HASHES_KEY) == 1
+        assert get_click_stats(url)["bot_clicks"] == 2
+        # Served fresh even while the rest of the stats are cached
+        request.META["REMOTE_ADDR"] = "66.249.66.3"
+        track_click(request, url)
+        assert get_click_stats(url)["bot_clicks"] == 3
+        flush_click_counts()
+        url.refresh_from_db()
+        assert url.click_count == 0
+
+    def test_sync_bot_ua_hashes(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track8",
+        )
+        ClickEvent.objects.create(
+            shortened_url=url,
+            ip_address="66.249.66.1",
+            device_type=ClickEvent.DeviceType.BOT,
+            user_agent="LegacyCrawler/1.0",
+        )
+
+        assert sync_bot_ua_hashes() == 1
+        request = self.factory.get(f"/{url.short_code}")
+        request.META["REMOTE_ADDR"] = "66.249.66.1"
+        request.META["HTTP_USER_AGENT"] = "LegacyCrawler/1.0"
+        assert track_click(request, url) is None
+
+    def test_flush_updates_daily_rollup(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track6",
+        )
+        request = self.factory.get(f"/{url.short_code}")
+        for ip in ("192.168.1.1", "192.168.1.2"):
+            request.META["REMOTE_ADDR"] = ip
+            track_click(request, url)
+        flush_click_events()
+        request.META["REMOTE_ADDR"] = "192.168.1.3"
+        track_click(request, url)
+        flush_click_events()
+
+        rollup = ClickDailyRollup.objects.get(shortened_url=url)
+        assert rollup.date == timezone.localdate()
+        assert rollup.count == 3
+
+    def test_flush_updates_dimension_rollups(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="track7",
+        )
+        for ip, referrer in (("10.0.0.1", "https://a.com/x"), ("10.0.0.2", "https://a.com/y")):
+            record_click(url.pk, ip_address=ip, referrer=referrer)
+            flush_click_events()
+
+        counts = {
+            (row.dimension, row.value): row.count
+            for row in ClickDimensionRollup.objects.filter(shortened_url=url)
+        }
+        assert counts[("referrer_host", "a.com")] == 2
+        assert counts[("device_type", "unknown")] == 2
+        assert counts[("country", "")] == 2
+
+
+@pytest.mark.django_db
+class TestTrackClickTask:
+    def test_task_records_click(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="task1",
+        )
+        track_click_task(
+            str(url.pk),
+            "192.168.1.1",
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0",
+            "https://google.com",
+            "10.0.0.1, 192.168.1.1",
+        )
+
+        flush_click_events()
+        click = ClickEvent.objects.get(shortened_url=url)
+        assert click.ip_address == "10.0.0.1"
+        assert click.referrer == "https://google.com"
+
+        flush_click_counts()
+        url.refresh_from_db()
+        assert url.click_count == 1
+
+    def test_redirect_enqueues_click(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="task2",
+        )
+        response = Client().get(f"/{url.short_code}", REMOTE_ADDR="192.168.1.1")
+
+        assert response.status_code == 302
+        assert response["Location"] == "https://example.com"
+        flush_click_events()
+        assert ClickEvent.objects.filter(shortened_url=url).count() == 1
+
+    def test_flush_clicks_command(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="task3",
+        )
+        record_click(url.pk, ip_address="192.168.1.1")
+
+        call_command("flush_clicks", stdout=io.StringIO())
+
+        url.refresh_from_db()
+        assert url.click_count == 1
+        assert ClickEvent.objects.filter(shortened_url=url).count() == 1
+
+
+@pytest.mark.django_db
+class TestClickStats:
+    def setup_method(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username="testuser", password="testpass")
+        self.url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="stats1",
+            created_by=self.user,
+        )
+
+    def _click(self, ua="Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0.0.0", ip="192.168.1.1"):
+        request = self.factory.get(f"/{self.url.short_code}")
+        request.META["REMOTE_ADDR"] = ip
+        request.META["HTTP_USER_AGENT"] = ua
+        track_click(request, self.url)
+        flush_click_events()
+
+    def test_aggregates(self):
+        self._click()
+        self._click(ip="192.168.1.2")
+        stats = get_click_stats(self.url)
+        assert stats["unique_visitors"] == 2
+        assert stats["clicks_by_day"][0]["count"] == 2
+        assert stats["top_browsers"] == [{"browser": "Chrome", "count": 2}]
+
+    def test_breakdowns_in_one_query(self, django_assert_num_queries):
+        other = ShortenedURL.objects.create(original_url="https://other.com", short_code="stats2")
+        ClickEvent.objects.bulk_create(
+            [ClickEvent(shortened_url=self.url, ip_address=f"10.0.0.{i}") for i in range(37)]
+        )
+        ClickDimensionRollup.objects.bulk_create(
+            [
+                ClickDimensionRollup(
+                    shortened_url=self.url, dimension="country", value=f"C{i:x}", count=3
+                )
+                for i in range(12)
+            ]
+            + [
+                ClickDimensionRollup(
+                    shortened_url=self.url, dimension="country", value="", count=1
+                ),
+                ClickDimensionRollup(
+                    shortened_url=self.url, dimension="referrer_host", value="a.com", count=1
+                ),
+                ClickDimensionRollup(
+                    shortened_url=self.url, dimension="device_type", value="unknown", count=37
+                ),
+                ClickDimensionRollup(shortened_url=other, dimension="country", value="ZZ", count=9),
+            ]
+        )
+
+        seed_unique_visitors()
+
+        with django_assert_num_queries(1):
+            stats = get_click_stats(self.url)
+
+        assert stats["unique_visitors"] == 37
+        assert len(stats["top_countries"]) == 10
+        assert "ZZ" not in {item["country"] for item in stats["top_countries"]}
+        assert stats["top_referrers"] == [{"referrer_host": "a.com", "count": 1}]
+        assert stats["top_devices"] == [{"device_type": "unknown", "count": 37}]
+
+    def test_unique_visitors_from_hyperloglog(self):
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1"):
+            record_click(self.url.pk, ip_address=ip)
+        assert get_click_stats(self.url)["unique_visitors"] == 2
+
+    def test_cached_until_refresh(self, django_assert_num_queries):
+        self._click()
+        assert get_click_stats(self.url)["top_browsers"][0]["count"] == 1
+        ClickDimensionRollup.objects.filter(
+            shortened_url=self.url, dimension="browser", value="Chrome"
+        ).update(count=F("count") + 1)
+        with django_assert_num_queries(0):
+            assert get_click_stats(self.url)["top_browsers"][0]["count"] == 1
+        assert get_click_stats(self.url, refresh=True)["top_browsers"][0]["count"] == 2
+
+    def test_flush_invalidates_cache(self):
+        self._click()
+        assert get_click_stats(self.url)["clicks_by_day"][0]["count"] == 1
+        self._click(ip="192.168.1.2")
+        assert get_click_stats(self.url)["clicks_by_day"][0]["count"] == 2
+
+    def test_analytics_page(self):
+        self._click()
+        client = Client()
+        client.login(username="testuser", password="testpass")
+        response = client.get(f"/analytics/{self.url.short_code}/")
+        assert response.status_code == 200
+        assert response.context["unique_visitors"] == 1
+        assert response.context["url"].click_count == 1
+        assert "updated_at" in response.context["url"].get_deferred_fields()
+        chart = json.loads(response.context["chart"])
+        assert chart == {"labels": [timezone.localdate().isoformat()], "data": [1]}
+
+
+class TestPartitions:
+    def test_add_months_rolls_over_year(self):
+        assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 15), 0) == date(2026, 1, 1)
+
+    @pytest.mark.django_db
+    def test_ensure_click_partitions(self):
+        created = ensure_click_partitions(months_ahead=1)
+        if connection.vendor == "postgresql":
+            assert ensure_click_partitions(months_ahead=1) == []
+        else:
+            assert created == []
+
+    @pytest.mark.django_db
+    @pytest.mark.skipif(connection.vendor != "postgresql", reason="PostgreSQL only")
+    def test_postgres_partitions_created_and_attached(self):
+        url = ShortenedURL.objects.create(original_url="https://example.com", short_code="part1")
+        month = add_months(timezone.now().date().replace(day=1), 3)
+        name = f"{CLICK_EVENT_TABLE}_{month:%Y_%m}"
+
+        with connection.cursor() as cursor:
+            # Left by migration 0006
+            assert is_partitioned(cursor, CLICK_EVENT_TABLE)
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                [CLICK_EVENT_TABLE],
+            )
+            assert cursor.fetchone()[0] == "PRIMARY KEY (id, clicked_at)"
+
+        assert ensure_click_partitions(months_ahead=3) == [name]
+        assert ensure_click_partitions(months_ahead=3) == []
+
+        click = ClickEvent.objects.create(
+            shortened_url=url,
+            clicked_at=datetime(month.year, month.month, 2, tzinfo=UTC),
+            ip_address="192.168.1.1",
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {CLICK_EVENT_TABLE} WHERE id = %s",
+                [click.pk],
+            )
+            assert cursor.fetchone()[0] == name
@@ -0,0 +1,15 @@
+"""Celery application for Structo URL Shortener.
+
+Tasks are discovered from each installed app's ``tasks`` module and
+configured from Django settings prefixed with ``CELERY_``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+app = Celery("config")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -0,0 +1,48 @@
+"""Shared Redis connection for counters and buffers kept outside the database."""
+
+import secrets
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+
+_client: redis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    """Return the process-wide Redis client.
+
+    The client is created lazily (after any worker fork) and is backed by a
+    thread-safe connection pool.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+@contextmanager
+def redis_lock(name: str, timeout: int) -> Iterator[bool]:
+    """Try to take a Redis lock for the duration of the block, without waiting.
+
+    Yields whether the lock was acquired. It is taken with ``SET NX EX`` and
+    expires after ``timeout`` seconds in case the holder dies. On exit it is
+    released only if it still holds this caller's token.
+    """
+    r = get_redis()
+    token = secrets.token_hex(16)
+    acquired = bool(r.set(name, token, nx=True, ex=timeout))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with r.pipeline() as pipe:
+                try:
+                    pipe.watch(name)
+                    if pipe.get(name) == token:
+                        pipe.multi()
+                        pipe.delete(name)
+                        pipe.execute()
+                except redis.WatchError:
+                    pass
@@ -119,3 +119,36 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 SHORTENER_CODE_LENGTH = int(os.environ.get("SHORTENER_CODE_LENGTH", "7"))
 SHORTENER_MAX_RETRIES = int(os.environ.get("SHORTENER_MAX_RETRIES", "5"))
 SITE_DOMAIN = os.environ.get("SITE_DOMAIN", "http://localhost:8000")
+
+# ---------------------------------------------------------------------------
+# Redis — click counters and Celery broker
+# ---------------------------------------------------------------------------
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# ---------------------------------------------------------------------------
+# Celery — background click tracking
+# ---------------------------------------------------------------------------
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", REDIS_URL)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_SERIALIZER = "json"
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_BEAT_SCHEDULE = {
+    "flush-click-counts": {
+        "task": "shortener.tasks.flush_click_counts_task",
+        "schedule": float(os.environ.get("CLICK_FLUSH_INTERVAL", "10")),
+    },
+    "flush-click-events": {
+        "task": "analytics.tasks.flush_click_events_task",
+        "schedule": float(os.environ.get("CLICK_FLUSH_INTERVAL", "10")),
+    },
+    "sync-bot-ua-hashes": {
+        "task": "analytics.tasks.sync_bot_ua_hashes_task",
+        "schedule": 24 * 60 * 60,
+    },
+    "ensure-click-partitions": {
+        "task": "analytics.tasks.ensure_click_partitions_task",
+        "schedule": 24 * 60 * 60,
+    },
+}
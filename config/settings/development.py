@@ -37,6 +37,12 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# ---------------------------------------------------------------------------
+# Celery — run tasks inline so local dev and tests need no worker or broker
+# ---------------------------------------------------------------------------
+
+CELERY_TASK_ALWAYS_EAGER = True
+
 # ---------------------------------------------------------------------------
 # WhiteNoise — serve static files normally in dev
 # ---------------------------------------------------------------------------
@@ -42,6 +42,17 @@ DATABASES = {
     )
 }
 
+# ---------------------------------------------------------------------------
+# Cache — shared Redis so cached analytics are reused across workers
+# ---------------------------------------------------------------------------
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,  # noqa: F405
+    }
+}
+
 # ---------------------------------------------------------------------------
 # Security
 # Railway (and most PaaS) terminate SSL at the proxy/load-balancer, so the
@@ -0,0 +1,23 @@
+"""Shared pytest fixtures."""
+
+import fakeredis
+import pytest
+from django.core.cache import cache
+
+from config import redis_client
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    """Back every test with its own empty in-memory Redis."""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, "_client", client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """Keep cached pages and aggregations from leaking between tests."""
+    cache.clear()
+    yield
+    cache.clear()
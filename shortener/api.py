@@ -1,13 +1,14 @@
 """Django-Ninja API endpoints for the URL shortener."""
 
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+import orjson
+from django.http import HttpResponse, HttpResponseNotModified
 from ninja import NinjaAPI, Router
+from ninja.responses import NinjaJSONEncoder
 from ninja.security import HttpBearer
 
-from analytics.models import ClickEvent
+from analytics.services import BREAKDOWN_DIMENSIONS, get_click_stats
 
-from .models import ShortenedURL
+from .models import ShortenedURL, site_domain
 from .schemas import (
     ErrorResponse,
     MessageResponse,
@@ -20,12 +21,19 @@ from .services import (
     CodeAlreadyExistsError,
     InvalidCodeError,
     ShortenerError,
+    apply_pending_clicks,
     create_short_url,
-    deactivate_url,
+    deactivate_user_url,
     generate_qr_code_svg,
-    get_user_urls,
+    get_user_url_rows,
+    live_urls,
+    resolve_redirect,
 )
 
+# Seconds clients and proxies may reuse a QR code before revalidating
+QR_CODE_MAX_AGE = 60 * 60
+
+
 # ---------------------------------------------------------------------------
 # Auth
 # ---------------------------------------------------------------------------
@@ -41,6 +49,12 @@ class SessionAuth(HttpBearer):
         return None
 
 
+def _require_user(request):
+    """Resolve the session user once; None for anonymous requests."""
+    user = request.user
+    return user if user.is_authenticated else None
+
+
 # ---------------------------------------------------------------------------
 # API instance
 # ---------------------------------------------------------------------------
@@ -53,7 +67,8 @@ api = NinjaAPI(
         "Shorten URLs, track clicks, and view analytics.\n\n"
         "**Public endpoints** — no auth required:\n"
         "- `POST /api/shorten` — Create a short URL\n"
-        "- `GET /api/urls/{short_code}` — Get URL info\n\n"
+        "- `GET /api/urls/{short_code}` — Get URL info\n"
+        "- `GET /api/urls/{short_code}/qr.svg` — QR code image\n\n"
         "**Authenticated endpoints** — login required:\n"
         "- `GET /api/urls/` — List your URLs\n"
         "- `DELETE /api/urls/{short_code}` — Deactivate a URL\n"
@@ -80,7 +95,7 @@ router = Router()
 def shorten_url(request, payload: ShortenURLRequest):
     """Create a new shortened URL."""
     # Custom codes require authentication
-    user = request.user if request.user.is_authenticated else None
+    user = _require_user(request)
     custom_code = payload.custom_code
 
     if custom_code and not user:
@@ -99,7 +114,7 @@ def shorten_url(request, payload: ShortenURLRequest):
     except ShortenerError as e:
         return 400, {"detail": str(e)}
 
-    qr_svg = generate_qr_code_svg(url.short_url)
+    qr_svg = generate_qr_code_svg(url.short_url) if payload.include_qr else None
 
     return 201, {
         "short_code": url.short_code,
@@ -122,13 +137,13 @@ def shorten_url(request, payload: ShortenURLRequest):
 def get_url_info(request, short_code: str):
     """Get info about a shortened URL."""
     try:
-        url = ShortenedURL.objects.get(short_code=short_code, is_active=True)
+        url = live_urls().only(
+            "id", "short_code", "original_url", "created_at", "click_count", "is_custom_code"
+        ).get(short_code=short_code)
     except ShortenedURL.DoesNotExist:
         return 404, {"detail": "URL not found."}
 
-    if url.is_expired:
-        return 404, {"detail": "This URL has expired."}
-
+    apply_pending_clicks([url])
     return {
         "short_code": url.short_code,
         "short_url": url.short_url,
@@ -139,11 +154,46 @@ def get_url_info(request, short_code: str):
     }
 
 
+@router.get(
+    "/urls/{short_code}/qr.svg",
+    response={200: None, 304: None, 404: ErrorResponse},
+    tags=["URLs"],
+    summary="QR code",
+    description="SVG QR code for a shortened URL. Cacheable for an hour.",
+)
+def get_url_qr_code(request, short_code: str):
+    """Serve the QR code for a live short URL as a cacheable SVG."""
+    # The cached redirect lookup, so revalidations rarely reach the database
+    target = resolve_redirect(short_code)
+    if target is None:
+        return 404, {"detail": "URL not found."}
+
+    # A code reissued to a new URL gets a new ETag
+    url_id, _ = target
+    etag = f'"{url_id}"'
+    if request.headers.get("If-None-Match") == etag:
+        return HttpResponseNotModified(headers={"ETag": etag})
+
+    # Not immutable: a deactivated code's QR should drop out of caches
+    return HttpResponse(
+        generate_qr_code_svg(f"{site_domain()}/{short_code}"),
+        content_type="image/svg+xml",
+        headers={
+            "Cache-Control": f"public, max-age={QR_CODE_MAX_AGE}",
+            "ETag": etag,
+        },
+    )
+
+
 # ---------------------------------------------------------------------------
 # Authenticated endpoints
 # ---------------------------------------------------------------------------
 
 
+# Encodes datetimes for list_user_urls() the way Ninja's own responses do
+_NINJA_ENCODER = NinjaJSONEncoder()
+
+
 @router.get(
     "/urls/",
     response={200: list[URLListResponse], 401: ErrorResponse},
@@ -153,22 +203,19 @@ def get_url_info(request, short_code: str):
 )
 def list_user_urls(request):
     """List all URLs for the authenticated user."""
-    if not request.user.is_authenticated:
+    user = _require_user(request)
+    if user is None:
         return 401, {"detail": "Authentication required."}
 
-    urls = get_user_urls(request.user)
-    return [
-        {
-            "short_code": url.short_code,
-            "short_url": url.short_url,
-            "original_url": url.original_url,
-            "created_at": url.created_at,
-            "click_count": url.click_count,
-            "is_active": url.is_active,
-            "is_custom_code": url.is_custom_code,
-        }
-        for url in urls
-    ]
+    # Rows already match URLListResponse; serialize them directly rather
+    # than validating every row through the schema. Datetimes go through
+    # Ninja's encoder so they match the other endpoints' format
+    body = orjson.dumps(
+        get_user_url_rows(user),
+        default=_NINJA_ENCODER.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+    return HttpResponse(body, content_type="application/json")
 
 
 @router.delete(
@@ -180,17 +227,12 @@ def list_user_urls(request):
 )
 def delete_url(request, short_code: str):
     """Deactivate a shortened URL."""
-    if not request.user.is_authenticated:
+    user = _require_user(request)
+    if user is None:
         return 401, {"detail": "Authentication required."}
 
-    try:
-        url = ShortenedURL.objects.get(
-            short_code=short_code, created_by=request.user, is_active=True
-        )
-    except ShortenedURL.DoesNotExist:
+    if not deactivate_user_url(user, short_code):
         return 404, {"detail": "URL not found or you don't have permission."}
-
-    deactivate_url(url)
     return {"message": "URL deactivated successfully."}
 
 
@@ -203,97 +245,35 @@ def delete_url(request, short_code: str):
 )
 def get_url_analytics(request, short_code: str):
     """Get detailed analytics for a shortened URL."""
-    if not request.user.is_authenticated:
+    user = _require_user(request)
+    if user is None:
         return 401, {"detail": "Authentication required."}
 
     try:
-        url = ShortenedURL.objects.get(
-            short_code=short_code, created_by=request.user
-        )
+        url = ShortenedURL.objects.only(
+            "id", "short_code", "original_url", "click_count"
+        ).get(short_code=short_code, created_by=user)
     except ShortenedURL.DoesNotExist:
         return 404, {"detail": "URL not found or you don't have permission."}
 
-    clicks = ClickEvent.objects.filter(shortened_url=url)
-
-    # Clicks by day
-    clicks_by_day = list(
-        clicks.annotate(date=TruncDate("clicked_at"))
-        .values("date")
-        .annotate(count=Count("id"))
-        .order_by("date")
-    )
-
-    # Top countries
-    top_countries = list(
-        clicks.exclude(country="")
-        .values("country")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:10]
-    )
+    apply_pending_clicks([url])
 
-    # Top browsers
-    top_browsers = list(
-        clicks.exclude(browser="")
-        .values("browser")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:10]
-    )
-
-    # Top OS
-    top_os = list(
-        clicks.exclude(os="")
-        .values("os")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:10]
-    )
-
-    # Top devices
-    top_devices = list(
-        clicks.values("device_type")
-        .annotate(count=Count("id"))
-        .order_by("-count")
-    )
-
-    # Top referrers
-    top_referrers = list(
-        clicks.exclude(referrer="")
-        .values("referrer")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:10]
-    )
-
-    # Unique visitors (by IP)
-    unique_visitors = clicks.values("ip_address").distinct().count()
+    # Same cached single-query aggregation as the analytics page
+    stats = get_click_stats(url)
 
     return {
         "short_code": url.short_code,
         "original_url": url.original_url,
         "total_clicks": url.click_count,
-        "unique_visitors": unique_visitors,
+        "unique_visitors": stats["unique_visitors"],
         "clicks_by_day": [
             {"date": item["date"].isoformat(), "count": item["count"]}
-            for item in clicks_by_day
-        ],
-        "top_countries": [
-            {"name": item["country"], "count": item["count"]}
-            for item in top_countries
-        ],
-        "top_browsers": [
-            {"name": item["browser"], "count": item["count"]}
-            for item in top_browsers
-        ],
-        "top_os": [
-            {"name": item["os"], "count": item["count"]}
-            for item in top_os
-        ],
-        "top_devices": [
-            {"name": item["device_type"], "count": item["count"]}
-            for item in top_devices
-        ],
-        "top_referrers": [
-            {"name": item["referrer"], "count": item["count"]}
-            for item in top_referrers
+            for item in stats["clicks_by_day"]
         ],
+        **{
+            key: [{"name": item[column], "count": item["count"]} for item in stats[key]]
+            for key, column, _ in BREAKDOWN_DIMENSIONS
+        },
     }
 
 
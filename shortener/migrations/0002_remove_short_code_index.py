@@ -0,0 +1,24 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:08
+
+from django.conf import settings
+from django.db import migrations
+
+from config.db_operations import RemoveIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # DROP INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('shortener', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        RemoveIndexConcurrentlyIfPostgres(
+            model_name='shortenedurl',
+            name='shortener_s_short_c_327481_idx',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+from config.db_operations import AddIndexConcurrentlyIfPostgres, RemoveIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE/DROP INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('shortener', '0002_remove_short_code_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='shortenedurl',
+            index=models.Index(fields=['created_by', 'is_active', '-created_at'], name='shortener_user_recent_idx'),
+        ),
+        RemoveIndexConcurrentlyIfPostgres(
+            model_name='shortenedurl',
+            name='shortener_s_created_90cebe_idx',
+        ),
+    ]
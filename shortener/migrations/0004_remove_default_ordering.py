@@ -0,0 +1,17 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shortener', '0003_user_recent_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='shortenedurl',
+            options={'verbose_name': 'Shortened URL', 'verbose_name_plural': 'Shortened URLs'},
+        ),
+    ]
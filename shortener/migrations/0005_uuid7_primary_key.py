@@ -0,0 +1,20 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:21
+
+from django.db import migrations, models
+
+import shortener.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shortener', '0004_remove_default_ordering'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shortenedurl',
+            name='id',
+            field=models.UUIDField(default=shortener.utils.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
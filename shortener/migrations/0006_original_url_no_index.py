@@ -0,0 +1,18 @@
+# Generated by Django 6.0.9 on 2026-10-14 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shortener', '0005_uuid7_primary_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shortenedurl',
+            name='original_url',
+            field=models.URLField(max_length=2048),
+        ),
+    ]
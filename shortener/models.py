@@ -1,17 +1,37 @@
 """Models for the URL shortener app."""
 
 import uuid
+from functools import lru_cache
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from .utils import uuid7
+
+
+@lru_cache(maxsize=1)
+def site_domain() -> str:
+    """``settings.SITE_DOMAIN`` without a trailing slash, read once."""
+    return settings.SITE_DOMAIN.rstrip("/")
+
+
+@receiver(setting_changed)
+def _reset_site_domain(*, setting, **kwargs):
+    if setting == "SITE_DOMAIN":
+        site_domain.cache_clear()
+
 
 class ShortenedURL(models.Model):
     """A shortened URL mapping."""
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    original_url = models.URLField(max_length=2048, db_index=True)
+    # Time-ordered so inserts append to the primary key index
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    original_url = models.URLField(max_length=2048)
     short_code = models.CharField(max_length=20, unique=True, db_index=True)
     is_custom_code = models.BooleanField(
         default=False,
@@ -38,10 +58,13 @@ class ShortenedURL(models.Model):
     )
 
     class Meta:
-        ordering = ["-created_at"]
         indexes = [
-            models.Index(fields=["created_by", "is_active"]),
-            models.Index(fields=["short_code", "is_active"]),
+            # Matches get_user_urls()' filter and ordering, so
+            # listing a user's URLs needs no sort step
+            models.Index(
+                fields=["created_by", "is_active", "-created_at"],
+                name="shortener_user_recent_idx",
+            ),
         ]
         verbose_name = "Shortened URL"
         verbose_name_plural = "Shortened URLs"
@@ -59,5 +82,41 @@ class ShortenedURL(models.Model):
     @property
     def short_url(self) -> str:
         """Return the full short URL."""
-        domain = settings.SITE_DOMAIN.rstrip("/")
-        return f"{domain}/{self.short_code}"
+        return f"{site_domain()}/{self.short_code}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so a save that renames the code also evicts the old code's
+        # cached redirect; None when short_code was deferred
+        instance._loaded_short_code = instance.__dict__.get("short_code")
+        return instance
+
+
+# Cached redirect target of a short code, or a miss (see
+# shortener.services.resolve_redirect)
+REDIRECT_CACHE_KEY = "redirect:{}"
+# Token naming the current version of a user's cached dashboard list
+USER_URLS_VERSION_KEY = "urls:version:{}"
+
+
+def user_urls_version(user_id) -> str:
+    """The current version token of a user's URL list."""
+    return cache.get_or_set(USER_URLS_VERSION_KEY.format(user_id), lambda: uuid.uuid4().hex, None)
+
+
+def bump_user_urls_version(user_id) -> None:
+    """Invalidate everything cached under the user's current URL-list version."""
+    cache.set(USER_URLS_VERSION_KEY.format(user_id), uuid.uuid4().hex, None)
+
+
+@receiver([post_save, post_delete], sender=ShortenedURL)
+def _invalidate_url_caches(sender, instance, **kwargs):
+    # Edits (admin, deactivation) can change where or whether a code
+    # redirects, and a new code may have a cached miss. A renamed code
+    # leaves its old code cached too.
+    codes = {instance.short_code, getattr(instance, "_loaded_short_code", None)}
+    cache.delete_many([REDIRECT_CACHE_KEY.format(code) for code in codes if code])
+    instance._loaded_short_code = instance.short_code
+    if instance.created_by_id is not None:
+        bump_user_urls_version(instance.created_by_id)
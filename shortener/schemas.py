@@ -10,6 +10,8 @@ class ShortenURLRequest(Schema):
 
     url: str
     custom_code: str | None = None
+    # QR rendering is opt-in; GET /api/urls/{code}/qr.svg serves it on demand
+    include_qr: bool = False
 
 
 class ShortenedURLResponse(Schema):
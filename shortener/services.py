@@ -2,18 +2,47 @@
 
 import io
 import logging
+import threading
+import uuid
+from functools import lru_cache
 
 import qrcode
 import qrcode.image.svg
+import redis
 from django.conf import settings
-from django.db import IntegrityError
-from django.db.models import F
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
 
-from .models import ShortenedURL
-from .utils import generate_short_code, is_valid_custom_code
+from config.redis_client import get_redis, redis_lock
+
+from .models import REDIRECT_CACHE_KEY, ShortenedURL, bump_user_urls_version, site_domain
+from .utils import generate_short_codes, is_valid_custom_code
 
 logger = logging.getLogger(__name__)
 
+# Redis hash of ``str(pk) -> clicks`` not yet written to ShortenedURL.click_count
+PENDING_CLICKS_KEY = "clicks:pending"
+# Snapshot of the pending hash while flush_click_counts() drains it
+FLUSHING_CLICKS_KEY = "clicks:pending:flushing"
+# Held for the duration of a flush so overlapping beat runs skip
+FLUSH_CLICKS_LOCK_KEY = "clicks:pending:flush-lock"
+FLUSH_CLICKS_LOCK_TIMEOUT = 5 * 60
+# Random codes checked per round when auto-generating a short code
+CODE_CANDIDATES_PER_ATTEMPT = 4
+# URLs updated per UPDATE statement when flushing click counts
+CLICK_FLUSH_CHUNK_SIZE = 500
+# Seconds a live code's redirect target is cached (capped at its expiry)
+REDIRECT_CACHE_TIMEOUT = 60 * 60
+# Seconds a code with no live URL is remembered as a miss, so repeated
+# probes for it (scrapers, typos) skip the database
+REDIRECT_MISS_TIMEOUT = 60
+# Cached in place of a target for codes with no live URL
+_REDIRECT_MISS = ""
+# Longest code the short_code column can hold
+SHORT_CODE_MAX_LENGTH = ShortenedURL._meta.get_field("short_code").max_length
+
 
 class ShortenerError(Exception):
     """Base exception for shortener service errors."""
@@ -58,15 +87,19 @@ def create_short_url(
                 "Custom code must be 3-20 characters, alphanumeric and hyphens only, "
                 "cannot start or end with a hyphen."
             )
-        if ShortenedURL.objects.filter(short_code=custom_code).exists():
-            raise CodeAlreadyExistsError(f"The code '{custom_code}' is already taken.")
-
-        return ShortenedURL.objects.create(
-            original_url=original_url,
-            short_code=custom_code,
-            is_custom_code=True,
-            created_by=user,
-        )
+        # Let the unique index arbitrate: one INSERT, no check-then-create race
+        try:
+            with transaction.atomic():
+                return ShortenedURL.objects.create(
+                    original_url=original_url,
+                    short_code=custom_code,
+                    is_custom_code=True,
+                    created_by=user,
+                )
+        except IntegrityError:
+            raise CodeAlreadyExistsError(
+                f"The code '{custom_code}' is already taken."
+            ) from None
 
     # Auto-generate a unique short code
     max_retries = settings.SHORTENER_MAX_RETRIES
@@ -75,43 +108,176 @@ def create_short_url(
     for attempt in range(max_retries):
         # Increase length on retry to reduce collision probability
         length = code_length + attempt
-        code = generate_short_code(length)
-        try:
-            return ShortenedURL.objects.create(
-                original_url=original_url,
-                short_code=code,
-                created_by=user,
-            )
-        except IntegrityError:
-            logger.warning(
-                "Short code collision on attempt %d: %s", attempt + 1, code
+        candidates = list(
+            dict.fromkeys(generate_short_codes(CODE_CANDIDATES_PER_ATTEMPT, length))
+        )
+        # One lookup weeds out taken codes instead of a failed INSERT apiece
+        taken = set(
+            ShortenedURL.objects.filter(short_code__in=candidates).values_list(
+                "short_code", flat=True
             )
-            continue
+        )
+        for code in candidates:
+            if code in taken:
+                continue
+            try:
+                # Savepoint so a collision doesn't abort the caller's transaction
+                with transaction.atomic():
+                    return ShortenedURL.objects.create(
+                        original_url=original_url,
+                        short_code=code,
+                        created_by=user,
+                    )
+            except IntegrityError:
+                # Taken between the lookup and the INSERT
+                logger.warning(
+                    "Short code collision on attempt %d: %s", attempt + 1, code
+                )
+        logger.warning("All short code candidates taken on attempt %d", attempt + 1)
 
     raise ShortenerError(
         "Unable to generate a unique short code. Please try again."
     )
 
 
+def live_urls():
+    """Active, non-expired URLs, with the expiry check done in SQL."""
+    return ShortenedURL.objects.filter(is_active=True).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+    )
+
+
 def resolve_url(short_code: str) -> ShortenedURL | None:
     """Look up an active, non-expired shortened URL.
 
-    Returns None if not found, inactive, or expired.
+    Returns None if not found, inactive, or expired. Only the columns needed
+    to redirect are loaded.
     """
     try:
-        url = ShortenedURL.objects.get(short_code=short_code, is_active=True)
+        return live_urls().only("id", "short_code", "original_url").get(short_code=short_code)
     except ShortenedURL.DoesNotExist:
         return None
 
-    if url.is_expired:
+
+def resolve_redirect(short_code: str) -> tuple[uuid.UUID, str] | None:
+    """Like resolve_url(), but just the ``(id, original_url)`` to redirect to.
+
+    Read-through cached, so hot links skip the database; entries are
+    dropped when the URL is saved or deleted and never outlive
+    ``expires_at``. Unknown codes are cached as misses for a minute.
+    Skips building a model instance on a miss too.
+    """
+    # Longer than the column allows, so it can't exist; not worth a cache entry
+    if len(short_code) > SHORT_CODE_MAX_LENGTH:
+        return None
+
+    key = REDIRECT_CACHE_KEY.format(short_code)
+    target = cache.get(key)
+    if target is not None:
+        return target or None
+
+    try:
+        url_id, original_url, expires_at = live_urls().values_list(
+            "id", "original_url", "expires_at"
+        ).get(short_code=short_code)
+    except ShortenedURL.DoesNotExist:
+        cache.set(key, _REDIRECT_MISS, REDIRECT_MISS_TIMEOUT)
         return None
 
-    return url
+    timeout = REDIRECT_CACHE_TIMEOUT
+    if expires_at is not None:
+        timeout = min(timeout, int((expires_at - timezone.now()).total_seconds()))
+    target = (url_id, original_url)
+    cache.set(key, target, timeout)
+    return target
+
+
+def increment_click_count(url_id, pipe=None) -> None:
+    """Record a click for the URL with this primary key.
+
+    The click is counted in Redis rather than with a row UPDATE so hot links
+    don't serialize on the row lock; flush_click_counts() moves the totals
+    into the database. Pass a Redis ``pipe`` to queue the increment alongside
+    the caller's other commands instead of sending it on its own.
+    """
+    (pipe or get_redis()).hincrby(PENDING_CLICKS_KEY, str(url_id), 1)
+
+
+def get_pending_click_counts(url_ids) -> dict[str, int]:
+    """Return clicks counted in Redis but not yet flushed, keyed by ``str(pk)``."""
+    ids = [str(pk) for pk in url_ids]
+    if not ids:
+        return {}
+
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.hmget(PENDING_CLICKS_KEY, ids)
+        pipe.hmget(FLUSHING_CLICKS_KEY, ids)
+        pending, flushing = pipe.execute()
+
+    return {
+        pk: int(queued or 0) + int(draining or 0)
+        for pk, queued, draining in zip(ids, pending, flushing, strict=True)
+        if queued or draining
+    }
+
 
+def apply_pending_clicks(urls) -> list[ShortenedURL]:
+    """Add unflushed clicks to each URL's ``click_count`` (in memory only)."""
+    urls = list(urls)
+    pending = get_pending_click_counts(url.pk for url in urls)
+    for url in urls:
+        url.click_count += pending.get(str(url.pk), 0)
+    return urls
 
-def increment_click_count(url: ShortenedURL) -> None:
-    """Atomically increment the click counter."""
-    ShortenedURL.objects.filter(pk=url.pk).update(click_count=F("click_count") + 1)
+
+def flush_click_counts() -> int:
+    """Move pending click counts from Redis into ShortenedURL.click_count.
+
+    The pending hash is atomically renamed to a snapshot first, so clicks
+    arriving mid-flush land in a fresh hash and are never lost. Each chunk of
+    the snapshot is HDEL'd as soon as its UPDATE commits, so a retry after a
+    failure only applies the chunks that didn't make it. A snapshot left
+    behind by a failed run is drained before a new one is taken, and a Redis
+    lock keeps overlapping runs from applying the same snapshot twice.
+
+    Returns the number of URLs updated.
+    """
+    r = get_redis()
+    with redis_lock(FLUSH_CLICKS_LOCK_KEY, FLUSH_CLICKS_LOCK_TIMEOUT) as acquired:
+        if not acquired:
+            return 0
+        if not r.exists(FLUSHING_CLICKS_KEY):
+            try:
+                r.rename(PENDING_CLICKS_KEY, FLUSHING_CLICKS_KEY)
+            except redis.ResponseError:
+                # Nothing pending
+                return 0
+
+        deltas = list(r.hgetall(FLUSHING_CLICKS_KEY).items())
+        for start in range(0, len(deltas), CLICK_FLUSH_CHUNK_SIZE):
+            chunk = deltas[start : start + CLICK_FLUSH_CHUNK_SIZE]
+            with transaction.atomic():
+                _add_click_counts(chunk)
+            r.hdel(FLUSHING_CLICKS_KEY, *(pk for pk, _ in chunk))
+    return len(deltas)
+
+
+def _add_click_counts(deltas: list[tuple[str, str]]) -> None:
+    """Add ``(pk, delta)`` pairs to click_count in one UPDATE ... FROM (VALUES ...)."""
+    qn = connection.ops.quote_name
+    table = qn(ShortenedURL._meta.db_table)
+    pk_field = ShortenedURL._meta.pk
+    params = []
+    for pk, delta in deltas:
+        params += [pk_field.get_db_prep_value(pk_field.to_python(pk), connection), int(delta)]
+    values = ", ".join(["(%s, %s)"] * len(deltas))
+    # VALUES columns are column1, column2 on both PostgreSQL and SQLite
+    sql = (
+        f"UPDATE {table} SET click_count = {table}.click_count + v.column2 "
+        f"FROM (VALUES {values}) AS v WHERE {table}.{qn(pk_field.column)} = v.column1"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
 
 
 def deactivate_url(url: ShortenedURL) -> None:
@@ -120,21 +286,80 @@ def deactivate_url(url: ShortenedURL) -> None:
     url.save(update_fields=["is_active", "updated_at"])
 
 
+def deactivate_user_url(user, short_code: str) -> bool:
+    """Soft-delete one of ``user``'s active URLs with a single UPDATE.
+
+    Returns False if the user has no active URL with that code.
+    """
+    updated = ShortenedURL.objects.filter(
+        short_code=short_code, created_by=user, is_active=True
+    ).update(is_active=False, updated_at=timezone.now())
+    if not updated:
+        return False
+    # update() skips the post_save receiver that invalidates the caches
+    cache.delete(REDIRECT_CACHE_KEY.format(short_code))
+    bump_user_urls_version(user.pk)
+    return True
+
+
 def get_user_urls(user, active_only: bool = True):
-    """Get all shortened URLs for a user."""
+    """Get all shortened URLs for a user, newest first."""
     qs = ShortenedURL.objects.filter(created_by=user)
     if active_only:
         qs = qs.filter(is_active=True)
-    return qs
+    return qs.order_by("-created_at")
+
+
+# Columns the URL list endpoint returns (plus the pk for pending clicks)
+URL_LIST_FIELDS = (
+    "id",
+    "short_code",
+    "original_url",
+    "created_at",
+    "click_count",
+    "is_active",
+    "is_custom_code",
+)
+
 
+def get_user_url_rows(user, active_only: bool = True) -> list[dict]:
+    """Like get_user_urls(), but as plain dicts with pending clicks applied.
 
+    Skips model instantiation for list responses that only serialize
+    columns; each row also gets its ``short_url``, and carries exactly the
+    fields of ``URLListResponse``.
+    """
+    rows = list(get_user_urls(user, active_only).values(*URL_LIST_FIELDS))
+    pending = get_pending_click_counts(row["id"] for row in rows)
+    domain = site_domain()
+    for row in rows:
+        row["click_count"] += pending.get(str(row.pop("id")), 0)
+        row["short_url"] = f"{domain}/{row['short_code']}"
+    return rows
+
+
+# The QR encoder isn't thread-safe, so each thread reuses its own
+_qr_local = threading.local()
+
+
+@lru_cache(maxsize=1024)
 def generate_qr_code_svg(url: str) -> str:
     """Generate an SVG QR code for a URL.
 
-    Returns the QR code as an SVG string.
+    Returns the QR code as an SVG string. Output is deterministic, so it is
+    memoized per URL.
     """
-    factory = qrcode.image.svg.SvgPathImage
-    img = qrcode.make(url, image_factory=factory, box_size=10)
+    qr = getattr(_qr_local, "qr", None)
+    if qr is None:
+        qr = _qr_local.qr = qrcode.QRCode(
+            box_size=10, image_factory=qrcode.image.svg.SvgPathImage
+        )
+    qr.clear()
+    # Re-fit from the smallest version; make() would otherwise start from
+    # the last URL's version
+    qr.version = None
+    qr.add_data(url)
+    qr.make(fit=True)
     stream = io.BytesIO()
-    img.save(stream)
+    qr.make_image().save(stream)
     return stream.getvalue().decode("utf-8")
@@ -0,0 +1,11 @@
+"""Celery tasks for the shortener app."""
+
+from celery import shared_task
+
+from .services import flush_click_counts
+
+
+@shared_task
+def flush_click_counts_task() -> int:
+    """Periodic (Celery beat) flush of Redis click counters into the database."""
+    return flush_click_counts()
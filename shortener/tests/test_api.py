@@ -1,10 +1,14 @@
 """Tests for the URL shortener API."""
 
+from datetime import UTC, datetime
+
 import pytest
 from django.contrib.auth.models import User
 from django.test import Client
 
+from analytics.services import flush_click_events, record_click
 from shortener.models import ShortenedURL
+from shortener.schemas import URLListResponse
 
 
 @pytest.mark.django_db
@@ -28,7 +32,7 @@ class TestShortenAPI:
     def test_shorten_url_with_qr(self):
         response = self.client.post(
             "/api/shorten",
-            data={"url": "https://example.com"},
+            data={"url": "https://example.com", "include_qr": True},
             content_type="application/json",
         )
         assert response.status_code == 201
@@ -36,6 +40,38 @@ class TestShortenAPI:
         assert data["qr_code_svg"] is not None
         assert "<svg" in data["qr_code_svg"]
 
+    def test_shorten_url_without_qr_by_default(self):
+        response = self.client.post(
+            "/api/shorten",
+            data={"url": "https://example.com"},
+            content_type="application/json",
+        )
+        assert response.status_code == 201
+        assert response.json()["qr_code_svg"] is None
+
+    def test_qr_code_endpoint(self):
+        ShortenedURL.objects.create(original_url="https://example.com", short_code="qr123")
+        response = self.client.get("/api/urls/qr123/qr.svg")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "image/svg+xml"
+        assert response["Cache-Control"] == "public, max-age=3600"
+        assert b"<svg" in response.content
+
+        cached = self.client.get("/api/urls/qr123/qr.svg", HTTP_IF_NONE_MATCH=response["ETag"])
+        assert cached.status_code == 304
+        assert self.client.get("/api/urls/nope/qr.svg").status_code == 404
+
+    def test_qr_code_not_modified_only_for_live_urls(self):
+        url = ShortenedURL.objects.create(original_url="https://example.com", short_code="qr456")
+        etag = self.client.get("/api/urls/qr456/qr.svg")["ETag"]
+
+        url.is_active = False
+        url.save()
+        response = self.client.get("/api/urls/qr456/qr.svg", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 404
+        response = self.client.get("/api/urls/never1/qr.svg", HTTP_IF_NONE_MATCH='"never1"')
+        assert response.status_code == 404
+
     def test_shorten_url_custom_code_requires_auth(self):
         response = self.client.post(
             "/api/shorten",
@@ -90,8 +126,23 @@ class TestUserURLsAPI:
         assert response.status_code == 200
         data = response.json()
         assert len(data) == 1
+        assert set(data[0]) == set(URLListResponse.model_fields)
         assert data[0]["short_code"] == "list123"
 
+    def test_list_urls_datetime_format_matches_info(self):
+        self.client.login(username="testuser", password="testpass")
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="when123",
+            created_by=self.user,
+        )
+        created_at = datetime(2026, 10, 14, 9, 39, 24, 373752, tzinfo=UTC)
+        ShortenedURL.objects.filter(pk=url.pk).update(created_at=created_at)
+
+        listed = self.client.get("/api/urls/").json()[0]["created_at"]
+        info = self.client.get("/api/urls/when123").json()["created_at"]
+        assert listed == info == "2026-10-14T09:39:24.373Z"
+
     def test_delete_url_authenticated(self):
         self.client.login(username="testuser", password="testpass")
         ShortenedURL.objects.create(
@@ -103,3 +154,24 @@ class TestUserURLsAPI:
         assert response.status_code == 200
         url = ShortenedURL.objects.get(short_code="del123")
         assert url.is_active is False
+
+    def test_url_analytics(self, django_assert_max_num_queries):
+        self.client.login(username="testuser", password="testpass")
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="stats123",
+            created_by=self.user,
+        )
+        record_click(url.pk, ip_address="10.0.0.1", referrer="https://news.example.com/a?b=1")
+        flush_click_events()
+
+        # session + user + URL lookups, then one aggregation query
+        with django_assert_max_num_queries(4):
+            response = self.client.get("/api/urls/stats123/analytics")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_clicks"] == 1
+        assert data["unique_visitors"] == 1
+        assert data["clicks_by_day"][0]["count"] == 1
+        assert data["top_referrers"] == [{"name": "news.example.com", "count": 1}]
@@ -47,6 +47,13 @@ class TestShortenedURL:
         )
         assert url.is_expired is False
 
+    def test_short_url_follows_site_domain(self, settings):
+        url = ShortenedURL(short_code="dom123")
+        settings.SITE_DOMAIN = "https://a.example/"
+        assert url.short_url == "https://a.example/dom123"
+        settings.SITE_DOMAIN = "https://b.example"
+        assert url.short_url == "https://b.example/dom123"
+
     def test_str_representation(self):
         url = ShortenedURL(
             original_url="https://example.com/path",
@@ -1,19 +1,42 @@
 """Tests for shortener services."""
 
+import io
+import time
+import uuid
+from datetime import timedelta
+
 import pytest
+import qrcode
+import qrcode.image.svg
 from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from shortener import services
 from shortener.models import ShortenedURL
 from shortener.services import (
     CodeAlreadyExistsError,
     InvalidCodeError,
+    apply_pending_clicks,
     create_short_url,
     deactivate_url,
+    deactivate_user_url,
+    flush_click_counts,
+    generate_qr_code_svg,
+    get_user_url_rows,
     get_user_urls,
     increment_click_count,
+    resolve_redirect,
     resolve_url,
 )
-from shortener.utils import generate_short_code, is_valid_custom_code
+from shortener.utils import (
+    ALPHABET,
+    generate_short_code,
+    generate_short_codes,
+    is_valid_custom_code,
+    uuid7,
+)
 
 
 class TestGenerateShortCode:
@@ -35,6 +58,24 @@ class TestGenerateShortCode:
         codes = {generate_short_code() for _ in range(1000)}
         assert len(codes) == 1000  # All should be unique
 
+    def test_batch(self):
+        codes = generate_short_codes(500, 8)
+        assert len(set(codes)) == 500
+        assert all(len(code) == 8 and set(code) <= set(ALPHABET) for code in codes)
+
+
+class TestUuid7:
+    def test_version_and_variant(self):
+        value = uuid7()
+        assert value.version == 7
+        assert value.variant == uuid.RFC_4122
+
+    def test_time_ordered(self, monkeypatch):
+        later = time.time_ns() + 10**6
+        first = uuid7()
+        monkeypatch.setattr("shortener.utils.time.time_ns", lambda: later)
+        assert uuid7() > first
+
 
 class TestIsValidCustomCode:
     def test_valid_codes(self):
@@ -58,6 +99,7 @@ class TestIsValidCustomCode:
     def test_special_chars(self):
         assert is_valid_custom_code("ab@c") is False
         assert is_valid_custom_code("ab c") is False
+        assert is_valid_custom_code("abc\n") is False
 
 
 @pytest.mark.django_db
@@ -85,6 +127,18 @@ class TestCreateShortUrl:
         create_short_url("https://example.com", user=user, custom_code="taken")
         with pytest.raises(CodeAlreadyExistsError):
             create_short_url("https://other.com", user=user, custom_code="taken")
+        # The failed INSERT is rolled back to a savepoint, not the whole transaction
+        assert ShortenedURL.objects.get(short_code="taken").original_url == "https://example.com"
+
+    def test_auto_code_skips_taken_candidates(self, monkeypatch):
+        ShortenedURL.objects.create(original_url="https://example.com", short_code="taken77")
+        rounds = iter([["taken77"] * 4, ["taken77", "free777", "taken77", "taken77"]])
+        monkeypatch.setattr(
+            "shortener.services.generate_short_codes", lambda count, length: next(rounds)
+        )
+
+        url = create_short_url("https://other.com")
+        assert url.short_code == "free777"
 
     def test_invalid_custom_code(self):
         user = User.objects.create_user(username="testuser", password="pass")
@@ -114,6 +168,53 @@ class TestResolveUrl:
         )
         assert resolve_url("inactive") is None
 
+    def test_resolve_expired(self):
+        ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="expired1",
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="future1",
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        assert resolve_url("expired1") is None
+        assert resolve_url("future1") is not None
+
+    def test_resolve_redirect(self):
+        created = ShortenedURL.objects.create(
+            original_url="https://example.com/target",
+            short_code="target1",
+        )
+        with CaptureQueriesContext(connection) as queries:
+            assert resolve_redirect("target1") == (created.pk, "https://example.com/target")
+        # A unique-code lookup needs no sort
+        assert "ORDER BY" not in queries.captured_queries[0]["sql"]
+        assert resolve_redirect("nonexist") is None
+
+    def test_resolve_redirect_cached_until_deactivated(self, django_assert_num_queries):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com/hot",
+            short_code="hot1",
+        )
+        assert resolve_redirect("hot1") == (url.pk, "https://example.com/hot")
+        with django_assert_num_queries(0):
+            assert resolve_redirect("hot1") == (url.pk, "https://example.com/hot")
+
+        deactivate_url(url)
+        assert resolve_redirect("hot1") is None
+
+    def test_resolve_redirect_caches_misses(self, django_assert_num_queries):
+        assert resolve_redirect("later1") is None
+        with django_assert_num_queries(0):
+            assert resolve_redirect("later1") is None
+            assert resolve_redirect("x" * 21) is None
+
+        # Creating the code clears its cached miss
+        url = ShortenedURL.objects.create(original_url="https://example.com", short_code="later1")
+        assert resolve_redirect("later1") == (url.pk, "https://example.com")
+
 
 @pytest.mark.django_db
 class TestIncrementClickCount:
@@ -123,7 +224,8 @@ class TestIncrementClickCount:
             short_code="click1",
         )
         assert url.click_count == 0
-        increment_click_count(url)
+        increment_click_count(url.pk)
+        flush_click_counts()
         url.refresh_from_db()
         assert url.click_count == 1
 
@@ -133,10 +235,88 @@ class TestIncrementClickCount:
             short_code="click2",
         )
         for _ in range(10):
-            increment_click_count(url)
+            increment_click_count(url.pk)
+        flush_click_counts()
         url.refresh_from_db()
         assert url.click_count == 10
 
+    def test_pending_clicks_not_written_until_flush(self):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="click3",
+        )
+        increment_click_count(url.pk)
+        url.refresh_from_db()
+        assert url.click_count == 0
+        assert apply_pending_clicks([url])[0].click_count == 1
+
+    def test_flush_resumes_interrupted_snapshot(self, redis):
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="click4",
+        )
+        increment_click_count(url.pk)
+        # Simulate a flush that died after taking its snapshot
+        redis.rename("clicks:pending", "clicks:pending:flushing")
+        increment_click_count(url.pk)
+
+        assert flush_click_counts() == 1
+        assert flush_click_counts() == 1
+        assert flush_click_counts() == 0
+        url.refresh_from_db()
+        assert url.click_count == 2
+
+    def test_flush_batches_updates(self, monkeypatch):
+        monkeypatch.setattr("shortener.services.CLICK_FLUSH_CHUNK_SIZE", 2)
+        urls = [
+            ShortenedURL.objects.create(original_url="https://example.com", short_code=f"batch{i}")
+            for i in range(3)
+        ]
+        for i, url in enumerate(urls):
+            for _ in range(i + 1):
+                increment_click_count(url.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert flush_click_counts() == 3
+
+        assert sum(q["sql"].startswith("UPDATE") for q in queries.captured_queries) == 2
+        assert [u.click_count for u in ShortenedURL.objects.order_by("short_code")] == [1, 2, 3]
+
+    def test_retry_skips_committed_chunks(self, monkeypatch):
+        monkeypatch.setattr("shortener.services.CLICK_FLUSH_CHUNK_SIZE", 1)
+        urls = [
+            ShortenedURL.objects.create(original_url="https://example.com", short_code=f"retry{i}")
+            for i in range(2)
+        ]
+        for url in urls:
+            increment_click_count(url.pk)
+
+        add_click_counts = services._add_click_counts
+        calls = []
+
+        def fail_second_chunk(deltas):
+            calls.append(deltas)
+            if len(calls) == 2:
+                raise DatabaseError("update failed")
+            add_click_counts(deltas)
+
+        with monkeypatch.context() as m:
+            m.setattr(services, "_add_click_counts", fail_second_chunk)
+            with pytest.raises(DatabaseError):
+                flush_click_counts()
+
+        assert flush_click_counts() == 1
+        assert [u.click_count for u in ShortenedURL.objects.order_by("short_code")] == [1, 1]
+
+    def test_flush_skipped_while_locked(self, redis):
+        url = ShortenedURL.objects.create(original_url="https://example.com", short_code="locked")
+        increment_click_count(url.pk)
+
+        redis.set(services.FLUSH_CLICKS_LOCK_KEY, "other-worker")
+        assert flush_click_counts() == 0
+        redis.delete(services.FLUSH_CLICKS_LOCK_KEY)
+        assert flush_click_counts() == 1
+
 
 @pytest.mark.django_db
 class TestDeactivateUrl:
@@ -150,6 +330,24 @@ class TestDeactivateUrl:
         url.refresh_from_db()
         assert url.is_active is False
 
+    def test_deactivate_user_url(self, django_assert_num_queries):
+        owner = User.objects.create_user(username="owner", password="pass")
+        other = User.objects.create_user(username="other", password="pass")
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com",
+            short_code="deact2",
+            created_by=owner,
+        )
+        resolve_redirect("deact2")
+
+        assert deactivate_user_url(other, "deact2") is False
+        with django_assert_num_queries(1):
+            assert deactivate_user_url(owner, "deact2") is True
+        assert deactivate_user_url(owner, "deact2") is False
+        url.refresh_from_db()
+        assert url.is_active is False
+        assert resolve_redirect("deact2") is None
+
 
 @pytest.mark.django_db
 class TestGetUserUrls:
@@ -183,3 +381,39 @@ class TestGetUserUrls:
         )
         urls = get_user_urls(user, active_only=True)
         assert urls.count() == 1
+
+    def test_user_url_rows(self, settings):
+        settings.SITE_DOMAIN = "https://sho.rt/"
+        user = User.objects.create_user(username="testuser", password="pass")
+        url = ShortenedURL.objects.create(
+            original_url="https://example.com/1",
+            short_code="rows1",
+            created_by=user,
+        )
+        increment_click_count(url.pk)
+
+        [row] = get_user_url_rows(user)
+        assert row["short_url"] == "https://sho.rt/rows1"
+        assert row["click_count"] == 1
+
+
+class TestGenerateQrCodeSvg:
+    @staticmethod
+    def _reference(url):
+        img = qrcode.make(url, image_factory=qrcode.image.svg.SvgPathImage, box_size=10)
+        stream = io.BytesIO()
+        img.save(stream)
+        return stream.getvalue().decode("utf-8")
+
+    def test_reused_encoder_matches_fresh_render(self):
+        long_url = "https://example.com/" + "a" * 300
+        short_url = "https://example.com/b"
+        generate_qr_code_svg.cache_clear()
+        assert generate_qr_code_svg(long_url) == self._reference(long_url)
+        assert generate_qr_code_svg(short_url) == self._reference(short_url)
+
+    def test_memoized(self):
+        generate_qr_code_svg.cache_clear()
+        generate_qr_code_svg("https://example.com/memo")
+        generate_qr_code_svg("https://example.com/memo")
+        assert generate_qr_code_svg.cache_info().hits == 1
@@ -0,0 +1,112 @@
+"""Tests for the shortener views."""
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from kombu.exceptions import OperationalError
+
+from shortener.models import ShortenedURL, user_urls_version
+from shortener.services import create_short_url, deactivate_user_url
+
+
+@pytest.mark.django_db
+class TestShortenView:
+    def test_anonymous_custom_code_ignored(self):
+        response = Client().post(
+            reverse("shortener:shorten"),
+            {"url": "https://example.com", "custom_code": "-bad code-"},
+        )
+        assert response.status_code == 200
+        url = ShortenedURL.objects.get()
+        assert url.is_custom_code is False
+        assert url.short_code != "-bad code-"
+
+    def test_authenticated_custom_code(self):
+        User.objects.create_user(username="maker", password="pass")
+        client = Client()
+        client.login(username="maker", password="pass")
+        client.post(
+            reverse("shortener:shorten"), {"url": "https://example.com", "custom_code": "my-code"}
+        )
+        assert ShortenedURL.objects.get().short_code == "my-code"
+
+
+@pytest.mark.django_db
+class TestRedirectView:
+    def test_redirects_when_broker_is_down(self, monkeypatch):
+        ShortenedURL.objects.create(original_url="https://example.com", short_code="down1")
+
+        def broker_down(*args, **kwargs):
+            raise OperationalError("broker unavailable")
+
+        monkeypatch.setattr("shortener.views.track_click_task.apply_async", broker_down)
+        response = Client().get(reverse("redirect", args=["down1"]))
+        assert response.status_code == 302
+        assert response["Location"] == "https://example.com"
+
+    def test_renamed_code_stops_redirecting(self):
+        ShortenedURL.objects.create(original_url="https://example.com", short_code="old1")
+        client = Client()
+        assert client.get(reverse("redirect", args=["old1"])).status_code == 302
+
+        url = ShortenedURL.objects.get(short_code="old1")
+        url.short_code = "new1"
+        url.save()
+        assert client.get(reverse("redirect", args=["old1"])).status_code == 404
+        assert client.get(reverse("redirect", args=["new1"])).status_code == 302
+
+
+@pytest.mark.django_db
+class TestDashboardCache:
+    def test_list_cached_until_urls_change(self):
+        user = User.objects.create_user(username="dash", password="pass")
+        create_short_url("https://example.com/1", user=user)
+        client = Client()
+        client.login(username="dash", password="pass")
+
+        assert client.get(reverse("shortener:dashboard")).status_code == 200
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse("shortener:dashboard"))
+        assert not any("shortener_shortenedurl" in q["sql"] for q in queries.captured_queries)
+
+        version = user_urls_version(user.pk)
+        url = create_short_url("https://example.com/2", user=user)
+        assert user_urls_version(user.pk) != version
+        assert url.short_code in client.get(reverse("shortener:dashboard")).content.decode()
+
+        version = user_urls_version(user.pk)
+        deactivate_user_url(user, url.short_code)
+        assert user_urls_version(user.pk) != version
+        assert url.short_code not in client.get(reverse("shortener:dashboard")).content.decode()
+
+    def test_list_is_paginated(self):
+        user = User.objects.create_user(username="dash", password="pass")
+        ShortenedURL.objects.bulk_create(
+            ShortenedURL(original_url="https://example.com", short_code=f"page{i}", created_by=user)
+            for i in range(51)
+        )
+        client = Client()
+        client.login(username="dash", password="pass")
+
+        response = client.get(reverse("shortener:dashboard"), {"page": 2})
+        page = response.context["page_obj"]
+        assert page.number == 2
+        assert len(page.object_list) == 1
+        assert "updated_at" in page.object_list[0].get_deferred_fields()
+
+    def test_list_queries_do_not_grow_with_urls(self):
+        user = User.objects.create_user(username="dash", password="pass")
+        create_short_url("https://example.com/1", user=user)
+        client = Client()
+        client.login(username="dash", password="pass")
+
+        with CaptureQueriesContext(connection) as one_url:
+            client.get(reverse("shortener:dashboard"))
+        for i in range(2, 7):
+            create_short_url(f"https://example.com/{i}", user=user)
+        with CaptureQueriesContext(connection) as six_urls:
+            client.get(reverse("shortener:dashboard"))
+        assert len(six_urls) == len(one_url)
@@ -1,27 +1,46 @@
 """Views for the URL shortener app."""
 
+import logging
+
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.http import require_GET, require_http_methods, require_POST
 
-from analytics.services import track_click
+from analytics.tasks import track_click_task
 
 from .forms import RegisterForm, ShortenURLForm
-from .models import ShortenedURL
+from .models import user_urls_version
 from .services import (
+    URL_LIST_FIELDS,
     CodeAlreadyExistsError,
     InvalidCodeError,
     ShortenerError,
+    apply_pending_clicks,
     create_short_url,
-    deactivate_url,
-    generate_qr_code_svg,
+    deactivate_user_url,
     get_user_urls,
-    resolve_url,
+    resolve_redirect,
 )
 
+logger = logging.getLogger(__name__)
+
+# Seconds a rendered dashboard list is reused; creating or deleting a URL
+# replaces it sooner, so this just bounds how stale its click counts get
+DASHBOARD_CACHE_TIMEOUT = 60
+DASHBOARD_PAGE_SIZE = 50
+
+# Unbound forms carry no per-request state, so the GET pages share one
+# instance instead of deep-copying the declared fields on every render.
+# Never bind or mutate these.
+_EMPTY_SHORTEN_FORM = ShortenURLForm()
+_EMPTY_REGISTER_FORM = RegisterForm()
+
 # ---------------------------------------------------------------------------
 # Home / Shorten
 # ---------------------------------------------------------------------------
@@ -29,24 +48,22 @@ from .services import (
 
 def home(request):
     """Landing page with URL shortening form."""
-    form = ShortenURLForm()
-    return render(request, "shortener/home.html", {"form": form})
+    return render(request, "shortener/home.html", {"form": _EMPTY_SHORTEN_FORM})
 
 
 @require_POST
 def shorten(request):
     """Handle URL shortening (HTMX partial response)."""
+    user = request.user if request.user.is_authenticated else None
     form = ShortenURLForm(request.POST)
+    # Only authenticated users can set custom codes; a disabled field ignores
+    # the posted value, so anonymous input is never cleaned or validated
+    form.fields["custom_code"].disabled = user is None
     if not form.is_valid():
         return render(request, "shortener/partials/form_errors.html", {"form": form})
 
-    user = request.user if request.user.is_authenticated else None
     custom_code = form.cleaned_data.get("custom_code") or None
 
-    # Only authenticated users can set custom codes
-    if custom_code and not user:
-        custom_code = None
-
     try:
         url = create_short_url(
             original_url=form.cleaned_data["url"],
@@ -60,15 +77,12 @@ def shorten(request):
             {"error_message": str(e)},
         )
 
-    qr_svg = generate_qr_code_svg(url.short_url)
-
+    # The QR code is loaded from the cacheable qr.svg endpoint, so it isn't
+    # rendered on this request
     return render(
         request,
         "shortener/partials/result.html",
-        {
-            "url": url,
-            "qr_svg": qr_svg,
-        },
+        {"url": url},
     )
 
 
@@ -80,14 +94,31 @@ def shorten(request):
 @require_GET
 def redirect_to_url(request, short_code: str):
     """Resolve a short code and redirect to the original URL."""
-    url = resolve_url(short_code)
-    if url is None:
+    target = resolve_redirect(short_code)
+    if target is None:
         raise Http404("Short URL not found or has expired.")
+    url_id, original_url = target
 
-    # Track the click asynchronously
-    track_click(request, url)
+    # Track the click in a background worker so the redirect isn't held up.
+    # A broker outage loses the click but must not stall or fail the redirect
+    meta = request.META
+    try:
+        track_click_task.apply_async(
+            (
+                str(url_id),
+                meta.get("REMOTE_ADDR", ""),
+                meta.get("HTTP_USER_AGENT", ""),
+                meta.get("HTTP_REFERER", ""),
+                meta.get("HTTP_X_FORWARDED_FOR", ""),
+                timezone.now().isoformat(),
+            ),
+            retry_policy={"max_retries": 0},
+        )
+    except Exception:
+        logger.exception("Could not enqueue click tracking for %s", short_code)
 
-    return redirect(url.original_url, permanent=False)
+    # Not shortcuts.redirect(): it first tries to reverse() the URL as a view name
+    return HttpResponseRedirect(original_url)
 
 
 # ---------------------------------------------------------------------------
@@ -97,19 +128,39 @@ def redirect_to_url(request, short_code: str):
 
 @login_required
 def dashboard(request):
-    """User dashboard showing their shortened URLs."""
-    urls = get_user_urls(request.user)
-    return render(request, "shortener/dashboard.html", {"urls": urls})
+    """User dashboard showing their shortened URLs.
+
+    The list is paginated and each page is a cached template fragment keyed
+    on the user's URL-list version, so its queries only run when the
+    fragment is rendered.
+    """
+    user = request.user
+    page_number = request.GET.get("page")
+
+    def load_page():
+        urls = get_user_urls(user).only(*URL_LIST_FIELDS)
+        page = Paginator(urls, DASHBOARD_PAGE_SIZE).get_page(page_number)
+        page.object_list = apply_pending_clicks(page.object_list)
+        return page
+
+    return render(
+        request,
+        "shortener/dashboard.html",
+        {
+            "page_obj": SimpleLazyObject(load_page),
+            "page_number": page_number,
+            "urls_version": user_urls_version(user.pk),
+            "list_cache_timeout": DASHBOARD_CACHE_TIMEOUT,
+        },
+    )
 
 
 @login_required
 @require_http_methods(["DELETE"])
 def delete_url_view(request, short_code: str):
     """HTMX-powered URL deletion."""
-    url = get_object_or_404(
-        ShortenedURL, short_code=short_code, created_by=request.user, is_active=True
-    )
-    deactivate_url(url)
+    if not deactivate_user_url(request.user, short_code):
+        raise Http404("No ShortenedURL matches the given query.")
     return HttpResponse("")
 
 
@@ -128,5 +179,5 @@ def register(request):
             messages.success(request, "Welcome! Your account has been created.")
             return redirect("shortener:dashboard")
     else:
-        form = RegisterForm()
+        form = _EMPTY_REGISTER_FORM
     return render(request, "registration/register.html", {"form": form})